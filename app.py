@@ -2,6 +2,7 @@ import streamlit as st
 import yaml
 import pandas as pd
 
+from utils.generate_taggings import warm_up_models
 from utils.streamlit.general_helpers import load_whitelist
 
 def main():
@@ -14,6 +15,9 @@ def main():
 
     """
 
+    # load the tagging models in the background (once per process), while the user logs in
+    warm_up_models()
+
     ### Session state variables to instantiate
     # For first run when submissions_df doesn't exist yet
     if 'submissions_df' not in st.session_state:
@@ -1,79 +1,157 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
 import time
+import uuid
 import yaml
 
 from pages.no_records_page import no_records_page 
-from utils.generate_taggings import step_1, step_2, step_3, step_4, step_5, step_6, step_7, step_8
+from utils.generate_taggings import (
+    PROFILE_MODE, PROFILE_RUNS, RAW_TEXT_COL_NAME, cascade_counts, run_steps
+)
+from utils.prediction_jobs import DONE, FAILED, QUEUED, get_job_executor
+from utils.profiling import profiled
+from utils.spans import spans_table
 
 
 # helper funcs
 from utils.streamlit.general_helpers import load_config
 
-# backend
-def predict_entries(progress_placeholder, container, df):
-    # status = container.empty()
-
-    # with status:
-    #     with st.spinner("Predicting entries...", show_time=True):
-
-    # start time of prediction
-    start_time = time.perf_counter()
-
-    progress_bar = progress_placeholder.progress(0.1, text="Step 0: Loading dataframe...")
-    spamshield_df = df.copy()
-    time.sleep(1)
-
-    progress_bar.progress(0.2, text="Step 1: Removing no record rows / no record indeces....")
-    complete_records_spamshield_df, spamshield_df, no_record_indeces = step_1(spamshield_df)
-
-
-    progress_bar.progress(0.3, text="Step 2: Generating spam code features....")
-    spamcode_df = step_2(complete_records_spamshield_df)
+#### CONFIGS ####
+# seconds between two looks at a running job
+POLL_INTERVAL_S = 1
 
 
-    progress_bar.progress(0.4, text="Step 3: Calling spam code model....")
-    spam_code_modeling_df, X = step_3(spamcode_df)
-
-
-    progress_bar.progress(0.5, text="Step 4: Determining spam code prediction....")
-    sms_no_spamcodes_df, spamcode_indeces = step_4(spam_code_modeling_df, X)
-
-
-    progress_bar.progress(0.6, text="Step 5: Generating spam type features....")
-    sms_no_spamcodes_no_url_no_imsi_df, imsi_indeces, url_indeces = step_5(sms_no_spamcodes_df)
-
+# backend
+def run_prediction(job, df, profile_run=False):
+    """Runs steps 1-8 on df as a background job, reporting progress to the job.
 
-    progress_bar.progress(0.7, text="Step 6: Generating embeddings....")
-    modeling_df = step_6(sms_no_spamcodes_no_url_no_imsi_df)
+    Runs in a job worker thread, so it never calls Streamlit.
+    """
+    job.report(0.1, "Step 0: Loading dataframe...")
 
+    # the pipeline reads df without copying or modifying it; the run is profiled when switched on
+    with profiled('predict_entries', profile_run, mode=PROFILE_MODE) as profile:
+        output_table, ctx = run_steps(df, progress=job.report, trace_name='predict_entries')
 
-    progress_bar.progress(0.8, text="Step 7: Predicting spam type....")
-    predicted_spam_type_indeces, label_mapping_df = step_7(modeling_df)
+    return {
+        'output_table': output_table,
+        'dedup': ctx.summary['dedup'],
+        'cascade_counts': cascade_counts(ctx),
+        'trace_table': spans_table(ctx.summary['spans']),
+        'profile': profile,
+    }
 
 
-    progress_bar.progress(1.0, text="Step 8: Assigning labels....")
-    output_table = step_8(
-        spamshield_df,
-        spamcode_indeces,
-        url_indeces,
-        imsi_indeces,
-        no_record_indeces,
-        predicted_spam_type_indeces,
-        label_mapping_df
+def merge_spam_tags(current_df, output_table):
+    """Copies the job's spam tags onto the current records, matching rows by id and message.
 
+    Records added, edited or deleted while the job ran keep their current state; returns the
+    merged frame and the number of current records the job did not tag.
+    """
+    if current_df.empty:
+        # e.g. a new session picking up the job after a reload: nothing to keep
+        return output_table, 0
+
+    keys = ['id', RAW_TEXT_COL_NAME]
+    tags = pd.Series(output_table['spam_tag'].to_numpy(), index=pd.MultiIndex.from_frame(output_table[keys]))
+    tags = tags[~tags.index.duplicated()]
+
+    current_keys = pd.MultiIndex.from_frame(current_df[keys])
+    matched = np.flatnonzero(current_keys.isin(tags.index))
+
+    merged = current_df.copy()
+    if 'spam_tag' not in merged:
+        merged['spam_tag'] = None
+    merged['spam_tag'] = merged['spam_tag'].astype(object)
+    merged.iloc[matched, merged.columns.get_loc('spam_tag')] = tags.reindex(current_keys[matched]).to_numpy()
+    return merged, len(current_df) - len(matched)
+
+
+def job_owner() -> str:
+    """Who prediction jobs belong to: the logged-in user, or else this session"""
+    if 'email' in st.session_state:
+        return st.session_state['email']
+    if '_job_owner' not in st.session_state:
+        st.session_state['_job_owner'] = uuid.uuid4().hex
+    return st.session_state['_job_owner']
+
+
+def predict_entries(df):
+    """Submits the records as a prediction job; the page polls it until it finishes"""
+    job = get_job_executor().submit(
+        job_owner(),
+        run_prediction,
+        df,
+        profile_run=st.session_state.get('profile_runs', PROFILE_RUNS)
     )
+    st.session_state.prediction_job_id = job.id
+
+
+def current_job():
+    """This session's prediction job, or the user's latest uncollected one (e.g. after a reload)"""
+    executor = get_job_executor()
+    job = executor.get(st.session_state.get('prediction_job_id'))
+    if job is None:
+        job = executor.latest_job(job_owner())
+        if job is not None and job.collected:
+            job = None
+    return job
+
+
+def show_job_progress(progress_placeholder, job):
+    """Shows where a queued or running job is"""
+    if job.status == QUEUED:
+        jobs_ahead = get_job_executor().queue_position(job)
+        progress_placeholder.progress(
+            0.0, text=f"Queued: waiting for {jobs_ahead + 1} prediction(s) to finish..."
+        )
+    else:
+        progress_placeholder.progress(job.progress, text=job.progress_text)
+
+
+def show_job_result(container, job, n_untagged=0):
+    """Shows the outcome of a finished job"""
+    if job.status == FAILED:
+        container.error(f"❌ Prediction failed: {job.error}")
+        return
 
-    # update the submissions df
-    st.session_state.submissions_df = output_table
+    result = job.result
+    waited = job.started_at - job.submitted_at
 
-    # end time of prediction
-    end_time = time.perf_counter()
+    # Show success inside the top container
+    dedup_summary = result['dedup']
+    container.success(
+        f"✅ Predictions successfully generated! Total runtime: {job.runtime_s:.2f} seconds"
+        f" (after {waited:.2f} seconds in the queue)"
+        f"\n\n{dedup_summary['unique_rows']} distinct messages out of {dedup_summary['rows']} "
+        f"records ({dedup_summary['dedup_ratio']:.1%} duplicates scored once)"
+    )
+    if n_untagged:
+        container.warning(
+            f"⚠️ {n_untagged} record(s) were added or edited while the prediction ran and "
+            "were not tagged. Click Predict again to tag them."
+        )
+
+    # rows left after each cheap rule, before the expensive stages
+    stage_counts = result['cascade_counts']
+    container.caption(
+        f"Cascade: {stage_counts['no_record']} no record · "
+        f"{stage_counts['spam_code_by_rule']} spam code by rule · "
+        f"{stage_counts['needs_model']} sent to the spam code model · "
+        f"{stage_counts['imsi']} IMSI only · {stage_counts['url_only']} URL only · "
+        f"{stage_counts['spam_type']} cleaned and embedded"
+    )
 
-    # calculate total run time
-    total_runtime = end_time - start_time
+    # where this batch spent its time
+    with container.expander("Time breakdown per step"):
+        st.dataframe(result['trace_table'], hide_index=True)
 
-    # Show success inside the top container
-    container.success(f"✅ Predictions successfully generated! Total runtime: {total_runtime:.2f} seconds")
+    profile = result['profile']
+    if profile is not None:
+        with container.expander("Profile: hottest functions"):
+            st.caption(f"Saved to {', '.join(profile.paths)}")
+            st.code(profile.summary, language=None)
 
 
 
@@ -83,8 +161,23 @@ def predict_page(COLUMN_CONFIG):
     UI when user chooses `Predict` as the selected CRUD operation
     """
     st.title('Predict Spam Type of Records')
-    
-    if st.session_state.submissions_df.empty:
+
+    # pick up the result of a finished job once
+    job = current_job()
+    finished_job = None
+    n_untagged = 0
+    if job is not None and job.finished and not job.collected:
+        job.collected = True
+        finished_job = job
+        if job.status == DONE:
+            # merge the tags into the submissions df, keeping edits made while the job ran
+            st.session_state.submissions_df, n_untagged = merge_spam_tags(
+                st.session_state.submissions_df, job.result['output_table']
+            )
+        st.session_state.pop('prediction_job_id', None)
+    running_job = job if job is not None and not job.finished else None
+
+    if st.session_state.submissions_df.empty and running_job is None:
         no_records_page()
         
         # Need to end with `return` so won't load the empty table
@@ -94,11 +187,17 @@ def predict_page(COLUMN_CONFIG):
 
     container.info(
         "ℹ️ Click the Predict button to perform batch prediction on all entries."
-        "\n\nPrediction time depends on how many entries you have."
+        "\n\nPrediction time depends on how many entries you have. Predictions run in the "
+        "background: you can leave this page and come back for the results."
     )
 
+    if finished_job is not None:
+        show_job_result(container, finished_job, n_untagged)
+
     # progress bar
     progress_placeholder = st.empty()
+    if running_job is not None:
+        show_job_progress(progress_placeholder, running_job)
 
     st.dataframe(
         st.session_state.submissions_df,
@@ -108,12 +207,25 @@ def predict_page(COLUMN_CONFIG):
     )
 
 
+    st.toggle(
+        'Profile prediction runs',
+        value=PROFILE_RUNS,
+        key='profile_runs',
+        help="Saves a flame-graph-ready profile and a hot-function summary of every run"
+    )
+
     st.button(
         'Predict',
         on_click=predict_entries,
-        args=[progress_placeholder, container, st.session_state.submissions_df],
+        args=[st.session_state.submissions_df],
+        disabled=running_job is not None,
         key='_predict_btn'
     )
+
+    # poll the running job until it finishes
+    if running_job is not None:
+        time.sleep(POLL_INTERVAL_S)
+        st.rerun()
     
 
 if __name__ == '__main__':
@@ -0,0 +1,35 @@
+"""Tests of SpamCodeModelFrame feature computation."""
+
+# third-party
+import pandas as pd
+import pytest
+
+# local
+from utils.spamcode_utils import SpamCodeModelFrame, URLEngine
+
+
+TEXTS = ['Visit bit . ly/abc now', 'ABC123456', 'hello po', '中文 http://a.com']
+
+
+@pytest.mark.parametrize('engine', ['rowwise', 'vectorized'])
+def test_custom_func_for_feature_with_dependencies(engine):
+    """A custom func for a registered feature is applied as func(text), without its dependencies"""
+    frame = SpamCodeModelFrame(pd.DataFrame({'CONTENT': TEXTS}))
+    df = frame.apply_features([('HAS_URL', lambda text: 7), 'CHAR_LENGTH'], engine=engine)
+
+    assert df['HAS_URL'].tolist() == [7] * len(TEXTS)
+    assert df['CHAR_LENGTH'].tolist() == [len(text) for text in TEXTS]
+
+
+def test_vectorized_matches_rowwise():
+    """Every vectorized feature gives the same values as its row-wise function"""
+    frame = SpamCodeModelFrame(pd.DataFrame({'CONTENT': TEXTS}))
+    frame.apply_features(engine='vectorized')
+    assert not any(frame.check_feature_equivalence().values())
+
+
+def test_replace_urls_one_at_a_time():
+    """URLs are replaced in extraction order, even when one URL appears inside another"""
+    text = 'go a.com/x?t=95OTurl a.com now'
+    urls = ['a.com', 'a.com/x?t=95OTurl']
+    assert URLEngine.replace_urls(text, urls) == 'go url/x?t=95OTurl url now'
@@ -0,0 +1,326 @@
+"""Benchmark suite for the spam code features, text cleaning, language routing and steps 1-8.
+
+Every benchmark runs on a seeded synthetic corpus (see utils.synthetic_corpus), so two runs
+with the same options measure the same work. Results are written as JSON; compare two
+result files to catch regressions. Run from the repo root (steps 3 and 6-7 load the
+models from models/):
+
+    python -m utils.benchmarks --output before.json
+    python -m utils.benchmarks --output after.json --sizes 1000 10000 50000
+    python -m utils.benchmarks --compare before.json after.json
+
+Each benchmark runs `--repeat` times in the same process. The first run pays for cold
+process-wide caches (lemmas, translations, the URL extractor, loaded models), so both the
+first and the median time are kept; rows/s is taken from the median.
+"""
+# pylint: disable=import-outside-toplevel
+
+# standard
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable
+
+# local
+from utils.synthetic_corpus import DEFAULT_SEED, generate_corpus
+
+
+#### CONFIGS ####
+BENCHMARK_OUTPUT_DIR = 'logs/benchmarks'
+MICRO_ROWS = 5000
+E2E_SIZES = [1000, 10_000]
+REPEAT = 3
+
+# rows/s drop, relative to the baseline, reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+def git_commit() -> str | None:
+    """Commit the working tree is at, if it is a git checkout"""
+    completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                               capture_output=True, text=True, check=False)
+    return completed.stdout.strip() or None
+
+
+def time_runs(run: Callable[[], None], repeat: int) -> list[float]:
+    """Wall time of every run, with the pipeline's progress output silenced"""
+    seconds = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def result(group: str, name: str, rows: int, seconds: list[float], **extra) -> dict:
+    """One benchmark result"""
+    median_s = statistics.median(seconds)
+    return {
+        'group': group,
+        'name': name,
+        'rows': rows,
+        'seconds': seconds,
+        'first_s': seconds[0],
+        'median_s': median_s,
+        'rows_per_s': rows / median_s if median_s > 0 else None,
+        **extra,
+    }
+
+
+def format_rate(rows_per_s: float | None, width: int = 0) -> str:
+    """rows/s for display, or 'n/a' when a run was too fast to time"""
+    return f"{rows_per_s:>{width}.0f}" if rows_per_s is not None else f"{'n/a':>{width}}"
+
+
+def run_benchmark(results: list[dict], group: str, name: str, benchmark: Callable[[], list[dict]]) -> None:
+    """Runs a benchmark, recording its error instead of stopping the suite if it fails"""
+    print(f"{group}/{name}...", flush=True)
+    try:
+        results.extend(benchmark())
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # e.g. a missing model or NLP resource: the rest of the suite still runs
+        print(f"  failed: {e!r}")
+        results.append({'group': group, 'name': name, 'error': repr(e)})
+        return
+    print(f"  {format_rate(results[-1]['rows_per_s'])} rows/s (median of {len(results[-1]['seconds'])})")
+
+
+############## MICRO-BENCHMARKS ##############
+def benchmark_feature(corpus, name: str, engine: str, repeat: int) -> list[dict]:
+    """One spam code feature, including the intermediates it depends on"""
+    from utils.generate_taggings import RAW_TEXT_COL_NAME
+    from utils.spamcode_utils import SpamCodeModelFrame
+
+    texts = corpus[[RAW_TEXT_COL_NAME]]
+    def run():
+        SpamCodeModelFrame(texts.copy(), raw_text_col_name=RAW_TEXT_COL_NAME)\
+            .apply_features([name], engine=engine)
+
+    return [result('feature', f'{name} ({engine})', len(texts), time_runs(run, repeat))]
+
+
+def benchmark_text_cleaning(corpus, *, debug: bool, repeat: int) -> list[dict]:
+    """Every clean_raw_text stage, from the stage throughput the preprocessor records.
+
+    CJK rows go through the offline 'local' translation backend, whose simulated round trip
+    stands in for the network.
+    """
+    from utils.generate_taggings import (
+        FIL_LEMMA_BATCH_SIZE, FIL_LEMMA_N_PROCESS, LANGUAGE_ROUTING, RAW_TEXT_COL_NAME
+    )
+    from utils.spamtype_utils import TextPreprocessor
+
+    mode = 'stepwise' if debug else 'fused'
+    texts = corpus[[RAW_TEXT_COL_NAME]]
+    stage_seconds = {}
+    total_seconds = []
+    for _ in range(repeat):
+        preprocessor = TextPreprocessor(texts.copy(),
+                                        raw_text_col_name=RAW_TEXT_COL_NAME,
+                                        fil_batch_size=FIL_LEMMA_BATCH_SIZE,
+                                        fil_n_process=FIL_LEMMA_N_PROCESS,
+                                        translation_backend='local',
+                                        debug=debug,
+                                        language_routing=LANGUAGE_ROUTING)
+        total_seconds.extend(time_runs(preprocessor.clean_raw_text, 1))
+        for stage, rows_per_s in preprocessor.stage_throughput.items():
+            stage_seconds.setdefault(stage, []).append(len(texts) / rows_per_s if rows_per_s else 0.0)
+
+    return [
+        result('text_cleaning', f'{stage} ({mode})', len(texts), seconds)
+        for stage, seconds in stage_seconds.items()
+    ] + [result('text_cleaning', f'clean_raw_text ({mode})', len(texts), total_seconds)]
+
+
+def benchmark_language_routing(corpus, repeat: int) -> list[dict]:
+    """clean_raw_text with and without language routing, and how often routing changes
+    TEXT_FINAL"""
+    from utils.generate_taggings import FIL_LEMMA_BATCH_SIZE, FIL_LEMMA_N_PROCESS, RAW_TEXT_COL_NAME
+    from utils.spamtype_utils import TextPreprocessor
+
+    texts = corpus[[RAW_TEXT_COL_NAME]]
+    seconds = {}
+    text_final = {}
+    routes = {}
+    for routing in (False, True):
+        def run():
+            preprocessor = TextPreprocessor(texts.copy(),
+                                            raw_text_col_name=RAW_TEXT_COL_NAME,
+                                            fil_batch_size=FIL_LEMMA_BATCH_SIZE,
+                                            fil_n_process=FIL_LEMMA_N_PROCESS,
+                                            translation_backend='local',
+                                            language_routing=routing)
+            text_final[routing] = preprocessor.clean_raw_text()['TEXT_FINAL'].to_numpy()
+            routes[routing] = preprocessor.routing_counts
+        seconds[routing] = time_runs(run, repeat)
+
+    unchanged = float((text_final[False] == text_final[True]).mean()) if len(texts) else 1.0
+    return [
+        result('text_cleaning', f'clean_raw_text (routing {"on" if routing else "off"})',
+               len(texts), seconds[routing], routes=routes[routing], text_final_unchanged=unchanged)
+        for routing in (False, True)
+    ]
+
+
+############## END TO END ##############
+def benchmark_pipeline(corpus, n_workers: int, repeat: int) -> list[dict]:
+    """Steps 1-8 on the whole corpus, with the wall time of every step of the median run"""
+    from utils.generate_taggings import run_steps
+
+    runs = []
+    def run():
+        _, ctx = run_steps(corpus.drop(columns='KIND'), n_workers)
+        runs.append(ctx)
+
+    seconds = time_runs(run, repeat)
+    median_ctx = runs[seconds.index(statistics.median_low(seconds))]
+    return [result('pipeline', f'steps 1-8 ({len(corpus)} rows)', len(corpus), seconds,
+                   dedup_ratio=median_ctx.summary['dedup']['dedup_ratio'],
+                   steps={span_['name']: span_['wall_s']
+                          for span_ in median_ctx.summary['spans'] if span_['depth'] == 0})]
+
+
+def run_suite(*, micro_rows: int, sizes: list[int], repeat: int, seed: int,
+              n_workers: int, only: str | None = None) -> dict:
+    """Runs the micro-benchmarks and the end-to-end benchmarks, returning every result"""
+    from utils import generate_taggings
+    from utils.spamcode_utils import SpamCodeModelFrame
+
+    # every run measures the full work: no frame display, span log or embedding cache hits
+    generate_taggings.SHOW_FRAMES = False
+    generate_taggings.SPAN_LOG_PATH = None
+    generate_taggings.EMBEDDING_CACHE_DIR = None
+
+    text_col_name = generate_taggings.RAW_TEXT_COL_NAME
+    results = []
+
+    if only in (None, 'micro'):
+        corpus = generate_corpus(micro_rows, seed=seed, text_col_name=text_col_name)
+        for name in SpamCodeModelFrame._feature_funcs:  # pylint: disable=protected-access
+            for engine in ('rowwise', 'vectorized'):
+                run_benchmark(results, 'feature', f'{name} ({engine})',
+                              lambda: benchmark_feature(corpus, name, engine, repeat))
+        for debug in (True, False):
+            run_benchmark(results, 'text_cleaning', 'stepwise' if debug else 'fused',
+                          lambda: benchmark_text_cleaning(corpus, debug=debug, repeat=repeat))
+        run_benchmark(results, 'text_cleaning', 'language routing',
+                      lambda: benchmark_language_routing(corpus, repeat))
+
+    if only in (None, 'e2e'):
+        for size in sizes:
+            corpus = generate_corpus(size, seed=seed, text_col_name=text_col_name)
+            run_benchmark(results, 'pipeline', f'{size} rows',
+                          lambda: benchmark_pipeline(corpus, n_workers, repeat))
+
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'micro_rows': micro_rows,
+            'sizes': sizes,
+            'repeat': repeat,
+            'n_workers': n_workers,
+            'config': {
+                'SPAM_CODE_FEATURE_ENGINE': generate_taggings.SPAM_CODE_FEATURE_ENGINE,
+                'EMBEDDING_BACKEND': generate_taggings.EMBEDDING_BACKEND,
+                'FIL_LEMMA_BATCH_SIZE': generate_taggings.FIL_LEMMA_BATCH_SIZE,
+                'LANGUAGE_ROUTING': generate_taggings.LANGUAGE_ROUTING,
+            },
+        },
+        'results': results,
+    }
+
+
+############## COMPARISON ##############
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> tuple[list[str], int]:
+    """Lines comparing the rows/s of every benchmark in both runs, and the number of regressions"""
+    def key(entry):
+        return entry['group'], entry['name']
+
+    baseline_results = {key(entry): entry for entry in baseline['results']}
+
+    lines = [f"baseline {baseline['meta']['commit']} ({baseline['meta']['started_at']})  "
+             f"vs  current {current['meta']['commit']} ({current['meta']['started_at']})"]
+    n_regressions = 0
+    for entry in current['results']:
+        before = baseline_results.get(key(entry))
+        label = f"{entry['group']}/{entry['name']}"
+        if before is None or 'error' in before or 'error' in entry:
+            lines.append(f"{label:<60} {'n/a':>12}")
+            continue
+
+        rates = f"{format_rate(before['rows_per_s'], 12)} -> {format_rate(entry['rows_per_s'], 12)} rows/s"
+        if not before['rows_per_s'] or entry['rows_per_s'] is None:
+            lines.append(f"{label:<60} {rates}")
+            continue
+
+        change = entry['rows_per_s'] / before['rows_per_s'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            n_regressions += 1
+        lines.append(f"{label:<60} {rates} ({change:+.1%}){flag}")
+    return lines, n_regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs the suite and writes its results, or compares two result files"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=None,
+                        help=f'results file (default: a timestamped file in {BENCHMARK_OUTPUT_DIR})')
+    parser.add_argument('--micro-rows', type=int, default=MICRO_ROWS,
+                        help='corpus size of the feature and text cleaning benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=E2E_SIZES,
+                        help='corpus sizes of the end-to-end benchmark')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--only', choices=['micro', 'e2e'], default=None)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two results files instead of running the suite')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='rows/s drop reported as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path, encoding='utf-8') as file:
+                runs.append(json.load(file))
+        lines, n_regressions = compare(*runs, threshold=args.threshold)
+        print('\n'.join(lines))
+        return 1 if n_regressions else 0
+
+    # tqdm reads its TQDM_* overrides when it is imported, so this goes first
+    os.environ.setdefault('TQDM_DISABLE', '1')
+
+    suite = run_suite(micro_rows=args.micro_rows, sizes=args.sizes, repeat=args.repeat,
+                      seed=args.seed, n_workers=args.workers, only=args.only)
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR,
+        f"{datetime.now():%Y%m%d-%H%M%S}-{suite['meta']['commit'] or 'nogit'}.json"
+    )
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(suite, file, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
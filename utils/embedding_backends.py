@@ -0,0 +1,238 @@
+"""Embedding model backends: PyTorch, ONNX Runtime, or int8-quantized ONNX Runtime on CPU.
+
+The ONNX backends run an export of the same model through sentence-transformers'
+ONNX Runtime backend. The export is written once to a local directory and reused.
+Compare the backends on a labelled sample with:
+
+    python -m utils.embedding_backends sample.csv --text-col TEXT_FINAL --label-col SPAM_TYPE
+"""
+# pylint: disable=import-outside-toplevel
+
+# standard
+import argparse
+import os
+import re
+import sys
+import time
+
+# third-party
+import numpy as np
+
+# local
+from utils import label_routing
+
+
+#### CONFIGS ####
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+ONNX_EXPORT_DIR = 'models/onnx'
+
+# instruction set the int8 weights are tuned for: 'avx2', 'avx512', 'avx512_vnni' or 'arm64'
+ONNX_QUANTIZATION = 'avx2'
+
+# SMS-sized defaults for length-bucketed batching (see encode_bucketed)
+MAX_SEQ_LENGTH = 256
+TOKEN_BUDGET = 8192     # padded tokens per batch
+MAX_BATCH_SIZE = 128
+
+BENCHMARK_BATCH_SIZE = 32
+LATENCY_SAMPLES = 50
+
+# spam type label words -> class numbers of the classifier
+SPAM_TYPE_LABELS = {label: class_num for class_num, label in enumerate(label_routing.SPAM_TYPE_LABELS)}
+
+
+def onnx_export_path(model_name: str, revision: str | None = None) -> str:
+    """Local directory holding the ONNX export of a model revision"""
+    name = model_name if revision is None else f'{model_name}@{revision}'
+    return os.path.join(ONNX_EXPORT_DIR, re.sub(r'[^A-Za-z0-9_.-]+', '_', name))
+
+
+def export_onnx_model(model_name: str, *, revision: str | None = None, quantize: bool = False) -> str:
+    """Exports a model to ONNX (and its int8 dynamic quantization) unless already exported.
+
+    Returns the file name of the ONNX graph, relative to the export directory.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    export_path = onnx_export_path(model_name, revision)
+    onnx_file = os.path.join('onnx', 'model.onnx')
+    int8_file = os.path.join('onnx', f'model_qint8_{ONNX_QUANTIZATION}.onnx')
+
+    if not os.path.exists(os.path.join(export_path, onnx_file)):
+        # loading with backend='onnx' exports the graph from the PyTorch weights
+        SentenceTransformer(model_name, revision=revision, backend='onnx').save_pretrained(export_path)
+
+    if not quantize:
+        return onnx_file
+
+    if not os.path.exists(os.path.join(export_path, int8_file)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(export_path, backend='onnx'),
+            quantization_config=ONNX_QUANTIZATION,
+            model_name_or_path=export_path
+        )
+    return int8_file
+
+
+def load_embedding_model(model_name: str, backend: str = 'torch', revision: str | None = None):
+    """Loads a SentenceTransformer running on the given backend.
+
+    revision pins the Hugging Face Hub commit (or tag) the weights are downloaded from.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', "
+                         f"expected one of {EMBEDDING_BACKENDS}")
+
+    if backend == 'torch':
+        return SentenceTransformer(model_name, revision=revision)
+
+    onnx_file = export_onnx_model(model_name, revision=revision, quantize=backend == 'onnx-int8')
+    return SentenceTransformer(
+        onnx_export_path(model_name, revision),
+        backend='onnx',
+        model_kwargs={'file_name': onnx_file, 'provider': 'CPUExecutionProvider'}
+    )
+
+
+############## BATCHING ##############
+def token_lengths(model, texts: list[str], max_seq_length: int) -> np.ndarray:
+    """Number of tokens of every text after truncation to max_seq_length"""
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        # rough estimate for models without a Hugging Face tokenizer: ~4 characters per token
+        return np.minimum(np.fromiter((len(text) // 4 + 1 for text in texts), dtype=np.int64,
+                                      count=len(texts)), max_seq_length)
+
+    input_ids = tokenizer(texts, truncation=True, max_length=max_seq_length)['input_ids']
+    return np.fromiter(map(len, input_ids), dtype=np.int64, count=len(texts))
+
+
+def length_bucketed_batches(lengths: np.ndarray,
+                            *,
+                            token_budget: int = TOKEN_BUDGET,
+                            max_batch_size: int = MAX_BATCH_SIZE) -> list[np.ndarray]:
+    """Positions of the texts grouped into batches of similar length.
+
+    Texts are sorted by length, and each batch grows while its padded size (rows times the
+    longest text in it) stays within token_budget, so short messages get large batches.
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        end = start + 1
+        # lengths are ascending, so the last text of a batch sets its padded length
+        while (end < len(order) and end - start < max_batch_size
+               and (end - start + 1) * lengths[order[end]] <= token_budget):
+            end += 1
+        batches.append(order[start:end])
+        start = end
+    return batches
+
+
+def encode_bucketed(model,
+                    texts: list[str],
+                    *,
+                    max_seq_length: int = MAX_SEQ_LENGTH,
+                    token_budget: int = TOKEN_BUDGET,
+                    max_batch_size: int = MAX_BATCH_SIZE,
+                    show_progress_bar: bool = True) -> np.ndarray:
+    """model.encode over length-bucketed, token-budgeted batches, returned in the original order"""
+    from tqdm import tqdm
+
+    model.max_seq_length = max_seq_length
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    lengths = token_lengths(model, texts, max_seq_length)
+    batches = length_bucketed_batches(lengths, token_budget=token_budget,
+                                      max_batch_size=max_batch_size)
+
+    embeddings = None
+    for batch in tqdm(batches, disable=not show_progress_bar):
+        batch_embeddings = np.asarray(
+            model.encode([texts[position] for position in batch], batch_size=len(batch)),
+            dtype=np.float32
+        )
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+        embeddings[batch] = batch_embeddings
+    return embeddings
+
+
+############## BENCHMARK ##############
+def benchmark_backend(model, texts: list[str]) -> dict:
+    """Throughput over all texts and single-message latency of one loaded model"""
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=BENCHMARK_BATCH_SIZE)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        model.encode([text])
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'embeddings': np.asarray(embeddings, dtype=np.float32),
+        'texts_per_s': len(texts) / elapsed if elapsed > 0 else float('inf'),
+        'latency_p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'latency_p95_ms': float(np.percentile(latencies, 95)) * 1000,
+    }
+
+
+def cosine_agreement(reference: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices"""
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(other, axis=1)
+    return np.sum(reference * other, axis=1) / np.maximum(norms, 1e-12)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Benchmarks every backend against the PyTorch embeddings of a sample of messages"""
+    import joblib
+    import pandas as pd
+
+    from utils.generate_taggings import EMBEDDING_MODEL, EMBEDDING_MODEL_REVISION, SMS_SPAM_TYPE_CLF_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sample', help='CSV of cleaned messages')
+    parser.add_argument('--text-col', default='TEXT_FINAL')
+    parser.add_argument('--label-col', default=None,
+                        help='spam type labels (words or 0-2), to report classifier accuracy')
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS),
+                        choices=EMBEDDING_BACKENDS)
+    args = parser.parse_args(argv)
+
+    sample = pd.read_csv(args.sample)
+    texts = sample[args.text_col].astype(str).tolist()
+    labels = None
+    if args.label_col:
+        labels = sample[args.label_col].replace(SPAM_TYPE_LABELS).astype(int).to_numpy()
+
+    sms_clf = joblib.load(SMS_SPAM_TYPE_CLF_PATH)
+    backends = ['torch'] + [backend for backend in args.backends if backend != 'torch']
+
+    reference = None
+    for backend in backends:
+        result = benchmark_backend(load_embedding_model(EMBEDDING_MODEL, backend, EMBEDDING_MODEL_REVISION), texts)
+        predictions = sms_clf.predict(pd.DataFrame(result['embeddings']))
+        if reference is None:
+            reference = {'embeddings': result['embeddings'], 'predictions': predictions}
+
+        cosine = cosine_agreement(reference['embeddings'], result['embeddings'])
+        line = (f"{backend:<10} {result['texts_per_s']:>8.1f} texts/s  "
+                f"p50 {result['latency_p50_ms']:>7.1f} ms  p95 {result['latency_p95_ms']:>7.1f} ms  "
+                f"cosine vs torch mean {cosine.mean():.4f} min {cosine.min():.4f}  "
+                f"same prediction {np.mean(predictions == reference['predictions']):.1%}")
+        if labels is not None:
+            line += f"  accuracy {np.mean(predictions == labels):.1%}"
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
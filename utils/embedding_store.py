@@ -0,0 +1,398 @@
+"""Content-addressed on-disk cache of message embeddings.
+
+Vectors live in one memory-mapped matrix per embedding model version, and an index maps
+the hash of each text to its row. Only texts missing from the store are encoded; the least
+recently used rows are evicted once the store is full. Stores of other model versions that
+have not been opened for STALE_STORE_DAYS are deleted.
+
+The index is a JSON snapshot plus an append-only log of the changes made by every lookup
+since. A lookup appends one line instead of rewriting the index, and the log is folded
+into a new snapshot once it outgrows it. Processes sharing a store (e.g. the app and the
+CLI) take a file lock for every lookup and first replay what the others appended.
+"""
+
+# standard
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+# third-party
+import numpy as np
+
+
+#### CONFIGS ####
+DEFAULT_MAX_ROWS = 200_000
+
+# rows the vector file grows by at a time, doubling up to max_rows
+INITIAL_CAPACITY = 1024
+
+# share of max_rows freed per eviction, so a full store does not evict on every run
+EVICTION_HEADROOM = 0.1
+
+# stores of other model versions unused for this long are deleted when a store is opened
+STALE_STORE_DAYS = 30
+
+
+def text_key(text: str) -> str:
+    """Content hash of a text, used as its key in the store"""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive lock on path (created if missing), waiting for other processes"""
+    with open(path, 'a+b') as file:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingStore:
+    """Embeddings of previously seen texts, for one embedding model version.
+
+    A store directory written for another model version or dtype is wiped when opened,
+    so a model change can never serve stale vectors. Several processes may share a store.
+    """
+
+    def __init__(self,
+                 root_dir: str,
+                 model_version: str,
+                 *,
+                 dtype: str = 'float32',
+                 max_rows: int = DEFAULT_MAX_ROWS) -> None:
+        """Open (or create) the store of a model version under root_dir"""
+        self.model_version = model_version
+        self.dtype = np.dtype(dtype)
+        self.max_rows = max_rows
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_version)
+        self.path = os.path.join(root_dir, name)
+
+        self.hits = 0
+        self.misses = 0
+
+        # the file lock sits next to the store, which _load_index may wipe
+        os.makedirs(root_dir, exist_ok=True)
+        self._lock_path = os.path.join(root_dir, name + '.lock')
+        self._lock = threading.Lock()
+        self._vectors = None
+        with file_lock(self._lock_path):
+            self._load_index()
+        self._prune_stale_stores(root_dir)
+
+
+    ############## FILES ##############
+    @property
+    def _index_path(self) -> str:
+        """Path of the JSON index snapshot"""
+        return os.path.join(self.path, 'index.json')
+
+    @property
+    def _log_path(self) -> str:
+        """Path of the log of index changes since the snapshot, one JSON line each"""
+        return os.path.join(self.path, 'index.log')
+
+    @property
+    def _vectors_path(self) -> str:
+        """Path of the raw vector matrix"""
+        return os.path.join(self.path, f'vectors.{self.dtype.name}')
+
+
+    def _load_index(self) -> None:
+        """Reads the index, wiping the store if it belongs to another model version or dtype"""
+        self.dim = None
+        self.capacity = 0
+        self.tick = 0
+        self._entries = {}     # text key -> [row, last used tick]
+        self._free_rows = set()
+        self._touched = {}     # text key -> tick of the hits not yet written to the log
+        self._generation = None
+        self._snapshot_bytes = 0
+        self._log_offset = 0
+
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding='utf-8') as file:
+                index = json.load(file)
+
+            if index['model_version'] == self.model_version and index['dtype'] == self.dtype.name:
+                self.dim = index['dim']
+                self.capacity = index['capacity']
+                self.tick = index['tick']
+                self._entries = index['entries']
+                self._generation = index.get('generation')
+                self._snapshot_bytes = os.path.getsize(self._index_path)
+                self._free_rows = set(range(self.capacity)) - {row for row, _ in self._entries.values()}
+                # the snapshot is only rewritten on compaction, so mark the store as in use
+                os.utime(self._index_path)
+            else:
+                shutil.rmtree(self.path)
+
+        os.makedirs(self.path, exist_ok=True)
+        if self._generation is None:
+            self._save_snapshot()
+        else:
+            self._replay_log()
+        self._map_vectors()
+
+
+    def _map_vectors(self) -> None:
+        """Maps the vector file at the current capacity"""
+        if self.dim is not None and self.capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode='r+',
+                                      shape=(self.capacity, self.dim))
+
+
+    def _save_snapshot(self) -> None:
+        """Writes the whole index as a new snapshot and starts an empty log after it.
+
+        Both files are replaced atomically; a log left over from an older snapshot is
+        recognised by its generation and ignored.
+        """
+        self._generation = uuid.uuid4().hex
+        index = {
+            'model_version': self.model_version,
+            'dtype': self.dtype.name,
+            'generation': self._generation,
+            'dim': self.dim,
+            'capacity': self.capacity,
+            'tick': self.tick,
+            'entries': self._entries,
+        }
+        for path, content in ((self._index_path, json.dumps(index)),
+                              (self._log_path, json.dumps({'generation': self._generation}) + '\n')):
+            with tempfile.NamedTemporaryFile('w', dir=self.path, suffix='.tmp',
+                                             delete=False, encoding='utf-8') as file:
+                file.write(content)
+            os.replace(file.name, path)
+        self._snapshot_bytes = os.path.getsize(self._index_path)
+        self._log_offset = os.path.getsize(self._log_path)
+
+
+    def _replay_log(self) -> None:
+        """Applies the changes appended to the log since this store last read it.
+
+        A snapshot written by another process since then is reloaded whole; a line cut short
+        by a crash is dropped.
+        """
+        if not os.path.exists(self._log_path):
+            self._save_snapshot()
+            return
+
+        with open(self._log_path, 'rb+') as file:
+            header = file.readline()
+            generation = json.loads(header)['generation'] if header.endswith(b'\n') else None
+            if generation != self._generation:
+                if self._log_offset:
+                    # compacted by another process: the snapshot has everything
+                    self._load_index()
+                else:
+                    # a log from before the snapshot, whose changes the snapshot already has
+                    self._save_snapshot()
+                return
+
+            file.seek(max(self._log_offset, len(header)))
+            for line in file:
+                if not line.endswith(b'\n'):
+                    file.truncate(file.tell() - len(line))
+                    break
+                self._apply(json.loads(line))
+            self._log_offset = file.tell()
+
+
+    def _apply(self, change: dict) -> None:
+        """Applies one logged lookup: new capacity, evicted, added and touched entries"""
+        self.tick = max(self.tick, change['tick'])
+        self.dim = change['dim']
+        if change['capacity'] > self.capacity:
+            self._free_rows.update(range(self.capacity, change['capacity']))
+            self.capacity = change['capacity']
+        for key in change['drop']:
+            if key in self._entries:
+                self._free_rows.add(self._entries.pop(key)[0])
+        for key, row in change['add'].items():
+            self._entries[key] = [row, change['tick']]
+            self._free_rows.discard(row)
+        for key, tick in change['touch'].items():
+            if key in self._entries:
+                self._entries[key][1] = max(self._entries[key][1], tick)
+
+
+    def _append_log(self, change: dict) -> None:
+        """Records the changes of one lookup, folding the log into a new snapshot once it
+        is larger than the snapshot"""
+        with open(self._log_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(change) + '\n')
+            self._log_offset = file.tell()
+        self._touched = {}
+        if self._log_offset > self._snapshot_bytes:
+            self._save_snapshot()
+
+
+    def _prune_stale_stores(self, root_dir: str) -> None:
+        """Deletes the stores of other model versions not opened for STALE_STORE_DAYS"""
+        cutoff = time.time() - STALE_STORE_DAYS * 24 * 3600
+        for name in os.listdir(root_dir):
+            store_path = os.path.join(root_dir, name)
+            index_path = os.path.join(store_path, 'index.json')
+            if (store_path != self.path and os.path.isfile(index_path)
+                    and os.path.getmtime(index_path) < cutoff):
+                shutil.rmtree(store_path, ignore_errors=True)
+                if os.path.exists(store_path + '.lock'):
+                    os.remove(store_path + '.lock')
+
+
+    def _grow(self, n_rows: int) -> list[str]:
+        """Makes room for n_rows more vectors, growing the file or evicting old rows.
+
+        Returns the keys of the evicted entries.
+        """
+        needed = len(self._entries) + n_rows
+        if needed > self.capacity and self.capacity < self.max_rows:
+            new_capacity = max(self.capacity, INITIAL_CAPACITY)
+            while new_capacity < needed:
+                new_capacity *= 2
+            new_capacity = min(new_capacity, self.max_rows)
+
+            if self._vectors is not None:
+                self._vectors.flush()
+            with open(self._vectors_path, 'ab') as file:
+                file.truncate(new_capacity * self.dim * self.dtype.itemsize)
+            self._free_rows.update(range(self.capacity, new_capacity))
+            self.capacity = new_capacity
+            self._map_vectors()
+
+        if needed > self.capacity:
+            return self._evict(max(needed - self.capacity, int(self.max_rows * EVICTION_HEADROOM)))
+        return []
+
+
+    def _evict(self, n_rows: int) -> list[str]:
+        """Frees the n_rows least recently used rows, sparing the texts of the current lookup"""
+        evictable = [key for key, (_, tick) in self._entries.items() if tick != self.tick]
+        oldest = sorted(evictable, key=lambda key: self._entries[key][1])[:n_rows]
+        for key in oldest:
+            self._free_rows.add(self._entries.pop(key)[0])
+        return oldest
+
+
+    ############## LOOKUPS ##############
+    def __len__(self) -> int:
+        """Number of cached embeddings"""
+        return len(self._entries)
+
+
+    def _sync(self) -> None:
+        """Picks up what other processes added or evicted since this store last looked"""
+        capacity = self.capacity
+        self._replay_log()
+        if self.capacity != capacity:
+            self._map_vectors()
+
+
+    def get_or_encode(self, texts: list[str], encode: Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings of texts, in order, calling encode(texts) only for texts not in the store.
+
+        The file lock is released while encode runs, so other processes are not kept waiting.
+        """
+        keys = [text_key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+
+        with self._lock:
+            with file_lock(self._lock_path):
+                self._sync()
+                self.tick += 1
+
+                # hits are copied out of the memmap, so that later evictions cannot change them
+                vectors_by_key = {}
+                for key in unique:
+                    if key in self._entries:
+                        row = self._entries[key][0]
+                        self._entries[key][1] = self.tick
+                        self._touched[key] = self.tick
+                        vectors_by_key[key] = np.array(self._vectors[row], dtype=np.float32, copy=True)
+            hits = list(vectors_by_key)
+            missing = [key for key in unique if key not in vectors_by_key]
+            self.hits += len(hits)
+            self.misses += len(missing)
+
+            # lookups that only hit leave the files alone; their recency is saved with the
+            # next change
+            if missing:
+                vectors = np.asarray(encode([unique[key] for key in missing]), dtype=np.float32)
+                vectors_by_key.update(zip(missing, vectors))
+                with file_lock(self._lock_path):
+                    self._add(missing, hits, vectors_by_key)
+
+            if texts:
+                return np.stack([vectors_by_key[key] for key in keys])
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+
+
+    def _add(self, missing: list[str], hits: list[str], vectors_by_key: dict) -> None:
+        """Caches newly encoded vectors and logs the change; called holding the file lock"""
+        self._sync()
+        if self.dim is None:
+            self.dim = len(vectors_by_key[missing[0]])
+
+        # this lookup's hits are spared by eviction; only the last new texts that fit next
+        # to them are cached, skipping any another process cached in the meantime
+        self.tick += 1
+        for key in hits:
+            if key in self._entries:
+                self._entries[key][1] = self._touched[key] = self.tick
+        room = self.max_rows - len(hits)
+        cached = [key for key in (missing[-room:] if room > 0 else []) if key not in self._entries]
+        evicted = self._grow(len(cached))
+        added = {}
+        for key in cached:
+            row = self._free_rows.pop()
+            self._vectors[row] = vectors_by_key[key]
+            self._entries[key] = [row, self.tick]
+            added[key] = row
+
+        # vectors reach the file before the log line that points at them
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._append_log({
+            'tick': self.tick,
+            'dim': self.dim,
+            'capacity': self.capacity,
+            'drop': evicted,
+            'add': added,
+            'touch': {key: self._entries[key][1] for key in self._touched if key in self._entries},
+        })
+
+
+    def stats(self) -> dict:
+        """Hits, misses, hit rate and size since the store was opened"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'capacity': self.capacity,
+        }
@@ -5,16 +5,30 @@ Pass a dataframe then this script will generate the spam tag outputs
 
 
 
+# ===== Standard libraries =====
+import os
+import time
+from collections import Counter
+from functools import cache
+from typing import Callable, Iterable, Iterator
+
 # ===== Third-party libraries =====
-from IPython.display import display
+# joblib, sentence_transformers (through embedding_backends) and IPython are imported
+# inside the functions that use them, so importing this module (e.g. from the Predict page)
+# stays cheap
+# pylint: disable=import-outside-toplevel
 import pandas as pd
 import numpy as np
-import joblib
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 
 # ===== Local/project imports =====
-from utils import spamcode_utils
+from utils import embedding_backends, spamcode_utils
+from utils.embedding_store import EmbeddingStore
+from utils.label_routing import class_to_label, route_labels
+from utils.model_registry import get_model_registry
+from utils.parallel import map_frame_chunks, apply_features_chunk, clean_raw_text_chunk
+from utils.pipeline_context import PipelineContext
+from utils.spans import Trace, span, traced_step
 from utils.spamtype_utils import TextPreprocessor
 
 # ===== Setup =====
@@ -28,250 +42,592 @@ URLCleaner = spamcode_utils.URLCleaner
 #### CONFIGS ####
 SPAM_CODE_CLF_PATH = 'models/spam_code_clf.pkl'
 EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+# Hugging Face Hub commit sha of EMBEDDING_MODEL; None follows the latest upload, which can
+# change the vectors behind an unchanged EMBEDDING_MODEL_VERSION
+EMBEDDING_MODEL_REVISION = None
+EMBEDDING_BACKEND = 'torch'   # 'torch', 'onnx' or 'onnx-int8' (CPU ONNX Runtime)
+EMBEDDING_MAX_SEQ_LENGTH = 256   # tokens; longer messages are truncated
+EMBEDDING_TOKEN_BUDGET = 8192   # padded tokens per embedding batch
+# change whenever the embedding model changes; the backend and truncation change the vectors too
+EMBEDDING_MODEL_VERSION = (f'{EMBEDDING_MODEL}@{EMBEDDING_MODEL_REVISION or "latest"}'
+                           f':{EMBEDDING_BACKEND}:{EMBEDDING_MAX_SEQ_LENGTH}')
+EMBEDDING_CACHE_DIR = 'cache/embeddings'   # None re-encodes every message on every run
+EMBEDDING_CACHE_DTYPE = 'float32'   # 'float16' halves the disk size
+EMBEDDING_CACHE_MAX_ROWS = 200_000
 SMS_SPAM_TYPE_CLF_PATH = 'models/sms_spam_type_clf.pkl'
 RAW_TEXT_COL_NAME = 'sms_content'
+N_WORKERS = 1   # > 1 runs steps 2 and 5 in a process pool
+SPAM_CODE_FEATURE_ENGINE = 'vectorized'   # 'rowwise' or 'vectorized'
+FIL_LEMMA_BATCH_SIZE = 256   # texts per calamancy nlp.pipe batch; None lemmatizes row by row
+FIL_LEMMA_N_PROCESS = 1
+LEMMA_CACHE_PATH = None   # e.g. 'cache/lemmas.json' to keep the lemma cache across restarts
+TRANSLATION_BACKEND = 'googletrans'   # 'googletrans', or 'local' to run offline
+TRANSLATION_CACHE_PATH = None   # e.g. 'cache/translations.json'
+TEXT_CLEANING_DEBUG = False   # True keeps every intermediate text cleaning column
+LANGUAGE_ROUTING = False   # True sends English-only messages past calamancy
+STREAM_CHUNK_ROWS = 50_000   # rows per chunk when tagging a file (bounds peak memory)
+SHOW_FRAMES = True   # display intermediate frames (turned off by the batch CLI)
+SPAN_LOG_PATH = 'logs/spans.jsonl'   # per-step timings of every traced run; None to skip
+PROFILE_RUNS = False   # True profiles every Predict page and CLI run (see utils.profiling)
+PROFILE_MODE = 'sampling'   # 'sampling' (collapsed stacks) or 'deterministic' (cProfile)
+
+# inputs of the spam code model (step 3)
+SPAM_CODE_FEATURES = [
+    "LETTER_TO_SYMBOL_RATIO",
+    "SPECIAL_CHAR_RATIO",
+    "MAX_CONSEC_CONSONANTS",
+    "HAS_IMSI_STR",
+    "HAS_CJK",
+    "HAS_URL",
+    "DIGIT_RATIO",
+    "CAPITAL_LETTER_TO_WORD_RATIO",
+    "CHAR_LENGTH",
+    "CAPITAL_LETTER_COUNT",
+    "WORD_COUNT",
+    "AVG_CAPS_PER_WORD",
+    "NON_SPACE_CHAR_LENGTH",
+    "HAS_UNICODE_ODDITIES",
+    "CHAR_ENTROPY",
+    "REGEX_SPAM"
+]
+
+# every feature column read by steps 3-5
+PIPELINE_FEATURES = SPAM_CODE_FEATURES + ['CLEANED_URL_STR']
+
+# cheap features computed for every distinct message first: they settle the spam code rule
+# for most rows, and route IMSI and URL-only messages, before the full feature set is needed
+CASCADE_FEATURES = ['REGEX_SPAM', 'HAS_IMSI_STR', 'HAS_CJK', 'HAS_URL', 'CLEANED_URL_STR']
+MODEL_ONLY_FEATURES = [name for name in SPAM_CODE_FEATURES if name not in CASCADE_FEATURES]
+
+# row selections reported by cascade_counts, in the order the cascade narrows them down
+CASCADE_STAGES = [
+    'all', 'no_record', 'complete', 'unique',
+    'spam_code_by_rule', 'not_spam_code_by_rule', 'needs_model', 'spam_code',
+    'imsi', 'url_only', 'spam_type'
+]
+
+# spam_tag of every row selection (step 8), applied in order: a later route wins where
+# selections overlap. A route has either one label or a column with one label per row.
+SPAM_TAG_ROUTES = [
+    {'selection': 'spam_code', 'label': 'SPAM_CODE'},
+    {'selection': 'url_only', 'label': 'URL_ONLY'},
+    {'selection': 'imsi', 'label': 'IMSI_ONLY'},
+    {'selection': 'no_record', 'label': 'NO_RECORD'},
+    {'selection': 'spam_type', 'column': 'SPAM_TYPE_PRED_WORD'},
+]
+
+
+############## MODELS ##############
+# loaded once per process on first use, and shared by every Streamlit session
+def load_spam_code_clf():
+    """Loads the spam code classifier"""
+    import joblib
+    return joblib.load(SPAM_CODE_CLF_PATH)
+
+
+def load_embedding_model():
+    """Loads the sentence embedding model on the configured backend"""
+    return embedding_backends.load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_MODEL_REVISION)
+
+
+def load_sms_spam_type_clf():
+    """Loads the spam type classifier"""
+    import joblib
+    return joblib.load(SMS_SPAM_TYPE_CLF_PATH)
+
+
+MODELS = get_model_registry()
+MODELS.register('spam_code_clf', load_spam_code_clf)
+MODELS.register(TextPreprocessor.FIL_NLP_MODEL_KEY, TextPreprocessor.load_fil_nlp_model)
+MODELS.register('embedding_model', load_embedding_model)
+MODELS.register('sms_spam_type_clf', load_sms_spam_type_clf)
+
+
+@cache
+def get_embedding_store() -> EmbeddingStore | None:
+    """Returns the process-wide embedding cache of the current model, if one is configured"""
+    if EMBEDDING_CACHE_DIR is None:
+        return None
+    return EmbeddingStore(
+        EMBEDDING_CACHE_DIR,
+        EMBEDDING_MODEL_VERSION,
+        dtype=EMBEDDING_CACHE_DTYPE,
+        max_rows=EMBEDDING_CACHE_MAX_ROWS
+    )
+
+
+def warm_up_models():
+    """Starts loading every tagging model in the background, once per process"""
+    return MODELS.warm_up()
+
+
+def display(df):
+    """Shows a frame in a notebook, or prints it when IPython is not available"""
+    if not SHOW_FRAMES:
+        return
+
+    try:
+        from IPython.display import display as ipython_display
+    except ImportError:
+        print(df)
+        return
+    ipython_display(df)
+
+
+
 
 ############## STEP 1 ##############
-def step_1(spamshield_df):
+@traced_step(rows_in='all', rows_out='complete')
+def step_1(ctx: PipelineContext):
     # print("\nStep 1: Removing no record rows / no record indeces....")
 
-    condition_1 = spamshield_df[RAW_TEXT_COL_NAME].str.strip().str.lower() == 'no record'
+    condition_1 = ctx.source[RAW_TEXT_COL_NAME].str.strip().str.lower() == 'no record'
     # condition_2 = raw_holdout_df['Campaign Key'].str.strip().str.lower() == 'no record'
-    complete_records_spamshield_df = spamshield_df[~(condition_1)].copy()
+    condition_1 = condition_1.to_numpy(dtype=bool)
 
-    no_record_indeces = spamshield_df[condition_1].index
+    ctx.select('no_record', condition_1)
+    ctx.select('complete', ~condition_1)
 
-    return complete_records_spamshield_df, spamshield_df, no_record_indeces
 
 
 
+############## DEDUP ##############
+@traced_step(rows_in='complete', rows_out='unique')
+def dedup_records(ctx: PipelineContext):
+    """
+    Collapse rows with identical text so steps 2-7 run once per distinct message.
+
+    Texts are compared exactly (after the str cast every step applies), since every
+    feature and cleaning step is sensitive to case, spacing and symbols.
+
+    Selects the first row of every distinct text as `unique`, and stores for each complete
+    row the position of the row that carries its text (DEDUP_POSITION).
+    """
+    texts = pd.Series(ctx.get(RAW_TEXT_COL_NAME, 'complete'), dtype=object).astype(str)
+
+    codes, _ = pd.factorize(texts)
+    ctx.select_where('unique', 'complete', ~texts.duplicated().to_numpy())
+    ctx.add('DEDUP_POSITION', ctx.positions('unique')[codes], 'complete')
+
+    n_rows, n_unique = ctx.size('complete'), ctx.size('unique')
+    ctx.summary['dedup'] = {
+        'rows': n_rows,
+        'unique_rows': n_unique,
+        'dedup_ratio': 1 - n_unique / n_rows if n_rows else 0.0
+    }
+
+
 
 
 ############## STEP 2 ##############
 
-def step_2(complete_records_spamshield_df):
+def generate_features(ctx: PipelineContext, features: list[str], selection: str, n_workers=N_WORKERS):
+    """Generates spam code features for the rows of a selection"""
+    if ctx.size(selection) == 0:
+        for name in features:
+            ctx.add(name, np.empty(0), selection)
+        return
+
+    with span(f'features ({selection})', rows_in=ctx.size(selection)) as features_span:
+        spamcode_features_df = map_frame_chunks(
+            apply_features_chunk,
+            ctx.frame([RAW_TEXT_COL_NAME], selection),
+            n_workers=n_workers,
+            raw_text_col_name=RAW_TEXT_COL_NAME,
+            features=features,
+            engine=SPAM_CODE_FEATURE_ENGINE
+        )
+        features_span.rows_out = len(spamcode_features_df)
+    display(spamcode_features_df)
+
+    ctx.add_frame(spamcode_features_df, features, selection)
+
+
+@traced_step(rows_in='unique', rows_out='needs_model')
+def step_2(ctx: PipelineContext, n_workers=N_WORKERS):
     # print("\nStep 2: Generating spam code features....")
-    spamcode_df = SpamCodeModelFrame(complete_records_spamshield_df, raw_text_col_name=RAW_TEXT_COL_NAME)
-    display(spamcode_df.apply_features())
 
-    return spamcode_df
+    # cheapest checks first
+    generate_features(ctx, CASCADE_FEATURES, 'unique', n_workers)
+
+    # the spam code rule of step 4 only needs the model when REGEX_SPAM does not decide it
+    regex_spam = ctx.get('REGEX_SPAM', 'unique') == 1
+    any_signal_missing = (
+        (ctx.get('HAS_IMSI_STR', 'unique') == 0)
+        | (ctx.get('HAS_CJK', 'unique') == 0)
+        | (ctx.get('HAS_URL', 'unique') == 0)
+    )
+
+    ctx.select_where('spam_code_by_rule', 'unique', regex_spam & any_signal_missing)
+    ctx.select_where('not_spam_code_by_rule', 'unique', ~any_signal_missing)
+    ctx.select_where('needs_model', 'unique', ~regex_spam & any_signal_missing)
+
+    # the remaining features only for the rows the model decides
+    generate_features(ctx, MODEL_ONLY_FEATURES, 'needs_model', n_workers)
 
 
 
 
 ############## STEP 3 ##############
-def step_3(spamcode_df):
+@traced_step(rows_in='needs_model', rows_out='needs_model')
+def step_3(ctx: PipelineContext):
     # print("\nStep 3: Calling spam code model....")
-    spam_code_clf = joblib.load(SPAM_CODE_CLF_PATH)
-    spamcode_features = [
-        "LETTER_TO_SYMBOL_RATIO",
-        "SPECIAL_CHAR_RATIO",
-        "MAX_CONSEC_CONSONANTS",
-        "HAS_IMSI_STR",
-        "HAS_CJK",
-        "HAS_URL",
-        "DIGIT_RATIO",
-        "CAPITAL_LETTER_TO_WORD_RATIO",
-        "CHAR_LENGTH",
-        "CAPITAL_LETTER_COUNT",
-        "WORD_COUNT",
-        "AVG_CAPS_PER_WORD",
-        "NON_SPACE_CHAR_LENGTH",
-        "HAS_UNICODE_ODDITIES",
-        "CHAR_ENTROPY",
-        "REGEX_SPAM"
-    ]
+    # only rows the rules of step 2 did not settle
+    if ctx.size('needs_model') == 0:
+        ctx.add('IS_SPAM_CODE_PRED', np.empty(0, dtype=np.int64), 'needs_model')
+        return
 
+    spam_code_clf = MODELS.get('spam_code_clf')
 
-    spam_code_modeling_df = spamcode_df.display_dataframe()
-    X = spam_code_modeling_df[spamcode_features]
+    X = ctx.frame(SPAM_CODE_FEATURES, 'needs_model')
 
-    X['IS_SPAM_CODE_PRED'] = spam_code_clf.predict(X)
-
-    return spam_code_modeling_df, X
+    ctx.add('IS_SPAM_CODE_PRED', spam_code_clf.predict(X), 'needs_model')
 
 
 
 
 
 ############## STEP 4 ##############
-def step_4(spam_code_modeling_df, X):
+@traced_step(rows_in='unique', rows_out='no_spam_code')
+def step_4(ctx: PipelineContext):
     # print("\nStep 4: Determining spam code prediction....")
-    df1 = spam_code_modeling_df[[RAW_TEXT_COL_NAME, 'REGEX_SPAM', 'HAS_CJK', 'HAS_IMSI_STR', 'HAS_URL']]
-    df2 = X[['IS_SPAM_CODE_PRED']]
+    # A row is classified as spam (1) if either:
+    # - REGEX_SPAM = 1, OR
+    # - IS_SPAM_CODE_PRED = 1,
+    # AND at least one of the following is 0:
+    # - HAS_IMSI_STR = 0
+    # - HAS_CJK = 0
+    # - HAS_URL = 0
+    # Step 2 already settled the rows where REGEX_SPAM = 1 or none of the three is 0, so the
+    # model prediction decides the rest
+    unique_positions = ctx.positions('unique')
+    is_spam_code = np.isin(unique_positions, ctx.positions('spam_code_by_rule'))
+    is_spam_code[np.isin(unique_positions, ctx.positions('needs_model'))] = (
+        ctx.get('IS_SPAM_CODE_PRED', 'needs_model') == 1
+    )
 
-    spam_code_eval_df = pd.concat([df1, df2], axis=1)
+    ctx.add('IS_SPAM_CODE_PRED_FINAL', is_spam_code.astype(np.int64), 'unique')
+    ctx.select_where('spam_code', 'unique', is_spam_code)
+    ctx.select_where('no_spam_code', 'unique', ~is_spam_code)
 
 
-    def get_final_spam_code_pred(row) -> int:
-        """
-        Determine the final spam code prediction for a given row.
-
-        A row is classified as spam (1) if either:
-        - REGEX_SPAM = 1, OR
-        - IS_SPAM_CODE_PRED = 1,
-        AND at least one of the following is 0:
-        - HAS_IMSI_STR = 0
-        - HAS_CJK = 0
-        - HAS_URL = 0
-        """
-        if (
-            (row['REGEX_SPAM'] == 1 or row['IS_SPAM_CODE_PRED'] == 1)
-            and (row['HAS_IMSI_STR'] == 0 or row['HAS_CJK'] == 0 or row['HAS_URL'] == 0)
-        ):
-            return 1
 
-        return 0
 
+############## STEP 5 ##############
+@traced_step(rows_in='no_spam_code', rows_out='spam_type')
+def step_5(ctx: PipelineContext, n_workers=N_WORKERS):
+    # print("\nStep 5: Generating spam type features....")
 
-    spam_code_eval_df['IS_SPAM_CODE_PRED_FINAL'] = spam_code_eval_df\
-                                                    .progress_apply(get_final_spam_code_pred, axis=1)
+    # IMSI and URL-only messages are routed first, so only spam type rows are cleaned
+    cleaned_url_str = pd.Series(ctx.get('CLEANED_URL_STR', 'no_spam_code'), dtype=object)
+    only_url_str_masking = (cleaned_url_str.str.strip() == 'url').to_numpy()
+    imsi_str_masking = ctx.get('HAS_IMSI_STR', 'no_spam_code') == 1
+
+
+    ctx.select_where('spam_type', 'no_spam_code', ~only_url_str_masking & ~imsi_str_masking)
+    ctx.select_where('imsi', 'no_spam_code', imsi_str_masking)
+    ctx.select_where('url_only', 'no_spam_code', only_url_str_masking)
+
+    if ctx.size('spam_type') == 0:
+        ctx.add('TEXT_FINAL', np.empty(0, dtype=object), 'spam_type')
+        return
+
+    # HAS_CJK from step 2 is passed along, so the text cleaning does not recompute it
+    cleaned_sms_spam_type_df = map_frame_chunks(
+        clean_raw_text_chunk,
+        ctx.frame([RAW_TEXT_COL_NAME, 'HAS_CJK'], 'spam_type'),
+        n_workers=n_workers,
+        raw_text_col_name=RAW_TEXT_COL_NAME,
+        fil_batch_size=FIL_LEMMA_BATCH_SIZE,
+        fil_n_process=FIL_LEMMA_N_PROCESS,
+        lemma_cache_path=LEMMA_CACHE_PATH,
+        translation_backend=TRANSLATION_BACKEND,
+        translation_cache_path=TRANSLATION_CACHE_PATH,
+        debug=TEXT_CLEANING_DEBUG,
+        language_routing=LANGUAGE_ROUTING
+    )
 
+    # if text_final is NaN, fill with raw_text instead 
+    ctx.add(
+        'TEXT_FINAL',
+        cleaned_sms_spam_type_df['TEXT_FINAL'].fillna(cleaned_sms_spam_type_df[RAW_TEXT_COL_NAME]),
+        'spam_type'
+    )
 
-    spamcode_indeces = spam_code_eval_df[spam_code_eval_df['IS_SPAM_CODE_PRED_FINAL'] == 1].index
 
-    non_spam_code_indices = spam_code_eval_df[spam_code_eval_df['IS_SPAM_CODE_PRED_FINAL'] == 0].index
 
-    sms_no_spamcodes_df = spam_code_modeling_df[spam_code_modeling_df.index.isin(non_spam_code_indices)]
 
-    return sms_no_spamcodes_df, spamcode_indeces
 
+############## STEP 6 ##############
+@traced_step(rows_in='spam_type', rows_out='spam_type')
+def step_6(ctx: PipelineContext):
+    # print("\nStep 6: Generating embeddings....")
 
+    if ctx.size('spam_type') == 0:
+        ctx.add('EMBEDDINGS', np.empty((0, 0), dtype=np.float32), 'spam_type')
+        return
 
+    # Step 1: Get texts as list
+    texts = ctx.get('TEXT_FINAL', 'spam_type').astype(str).tolist()
+
+    # Step 2: Batch encode (the model is loaded once per process, and only if needed);
+    # texts of similar token length are batched together, then put back in order
+    def encode(texts_to_encode):
+        return embedding_backends.encode_bucketed(
+            MODELS.get('embedding_model'),
+            texts_to_encode,
+            max_seq_length=EMBEDDING_MAX_SEQ_LENGTH,
+            token_budget=EMBEDDING_TOKEN_BUDGET
+        )
 
-############## STEP 5 ##############
-def step_5(sms_no_spamcodes_df):
-    # print("\nStep 5: Generating spam type features....")
+    embedding_store = get_embedding_store()
+    if embedding_store is None:
+        embeddings = encode(texts)
+    else:
+        # only messages not embedded by an earlier run are encoded
+        embeddings = embedding_store.get_or_encode(texts, encode)
+        ctx.summary['embedding_cache'] = embedding_store.stats()
 
-    filtered_sms_no_spamcodes_df = sms_no_spamcodes_df.copy()
+    # Step 3: Keep embeddings as one matrix, one row per message
+    ctx.add('EMBEDDINGS', embeddings, 'spam_type')
 
-    text_cleaning_pipeline = TextPreprocessor(filtered_sms_no_spamcodes_df, raw_text_col_name=RAW_TEXT_COL_NAME)
-    cleaned_sms_no_spamcodes_df = text_cleaning_pipeline.clean_raw_text()
 
-    # if text_final is NaN, fill with raw_text instead 
-    cleaned_sms_no_spamcodes_df['TEXT_FINAL'] = cleaned_sms_no_spamcodes_df['TEXT_FINAL']\
-                                                    .fillna(cleaned_sms_no_spamcodes_df[RAW_TEXT_COL_NAME])
 
 
-    only_url_str_masking = cleaned_sms_no_spamcodes_df['CLEANED_URL_STR'].str.strip() == 'url'
-    imsi_str_masking = cleaned_sms_no_spamcodes_df['HAS_IMSI_STR'] == 1
+############## STEP 7 ##############
+@traced_step(rows_in='spam_type', rows_out='spam_type')
+def step_7(ctx: PipelineContext):
+    # print("\nStep 7: Predicting spam type....")
 
+    if ctx.size('spam_type') == 0:
+        ctx.add('SPAM_TYPE_PRED_NUM', np.empty(0, dtype=np.int64), 'spam_type')
+        ctx.add('SPAM_TYPE_PRED_WORD', np.empty(0, dtype=object), 'spam_type')
+        return
 
-    sms_no_spamcodes_no_url_no_imsi_df = cleaned_sms_no_spamcodes_df[~only_url_str_masking 
-                                                                    & ~imsi_str_masking]
+    sms_clf = MODELS.get('sms_spam_type_clf')
+    embeddings = pd.DataFrame(ctx.get('EMBEDDINGS', 'spam_type'))
+    spam_type_pred_num = np.asarray(sms_clf.predict(embeddings))
 
-    imsi_indeces = cleaned_sms_no_spamcodes_df[imsi_str_masking].index
-    url_indeces = cleaned_sms_no_spamcodes_df[only_url_str_masking].index
+    # 0 -> COMMERCIAL, 1 -> LOAN/SCAM/SPAM, anything else -> P2P
+    ctx.add('SPAM_TYPE_PRED_NUM', spam_type_pred_num, 'spam_type')
+    ctx.add('SPAM_TYPE_PRED_WORD', class_to_label(spam_type_pred_num), 'spam_type')
 
-    return sms_no_spamcodes_no_url_no_imsi_df, imsi_indeces, url_indeces
 
 
 
+############## STEP 8 ##############
+@traced_step(rows_in='all', rows_out='all')
+def step_8(ctx: PipelineContext):
 
+    # print("\nStep 8: Assigning labels....")
+    output_table = ctx.source.copy()
+
+    # rows are addressed by position, so the index of the input never matters
+    if 'spam_tag' in output_table.columns:
+        spam_tags = output_table['spam_tag'].to_numpy(dtype=object)
+    else:
+        spam_tags = np.full(ctx.n_rows, np.nan, dtype=object)
+
+    # spam codes, url, imsi, no records, spam types
+    spam_tags = route_labels(spam_tags, [
+        (
+            ctx.positions(route['selection']),
+            route['label'] if 'label' in route else ctx.get(route['column'], route['selection'])
+        )
+        for route in SPAM_TAG_ROUTES
+    ])
 
-############## STEP 6 ##############
-def step_6(sms_no_spamcodes_no_url_no_imsi_df):
-    # print("\nStep 6: Generating embeddings....")
+    # copy each distinct text's label to its duplicates
+    complete_positions = ctx.positions('complete')
+    spam_tags[complete_positions] = spam_tags[ctx.get('DEDUP_POSITION', 'complete')]
 
+    output_table['spam_tag'] = spam_tags
 
-    cols_to_keep = ['sender', 'TEXT_FINAL']
-    modeling_df = sms_no_spamcodes_no_url_no_imsi_df.copy()[cols_to_keep]
 
-    # Load model
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    # print("\nPrediction complete!")
+    # print(output_table)
 
-    # Optional: show progress bar for batches
-    tqdm.pandas()
+    return output_table
 
-    # Step 1: Get texts as list
-    texts = modeling_df['TEXT_FINAL'].astype(str).tolist()
 
-    # Step 2: Batch encode
-    embeddings = model.encode(texts, show_progress_bar=True, batch_size=32)  # you can tune batch_size
+def cascade_counts(ctx: PipelineContext) -> dict:
+    """Rows left at every stage of the cascade reached so far"""
+    return {stage: ctx.size(stage) for stage in CASCADE_STAGES if ctx.has_selection(stage)}
 
-    # Step 3: Save embeddings to one column
-    modeling_df['EMBEDDINGS'] = embeddings.tolist()
 
-    return modeling_df
+def run_steps(df: pd.DataFrame,
+              n_workers=N_WORKERS,
+              *,
+              progress: Callable[[float, str], None] | None = None,
+              trace_name: str = 'generate_taggings') -> tuple[pd.DataFrame, PipelineContext]:
+    """Runs steps 1-8 on a frame, returning the tagged frame and the context of the run.
 
+    progress(share_done, message) is called before every step, e.g. to drive a progress bar.
+    The timing spans of the run are kept in ctx.summary['spans'] and logged to SPAN_LOG_PATH.
+    """
+    report = progress or (lambda share_done, message: None)
+    ctx = PipelineContext(df, raw_text_col_name=RAW_TEXT_COL_NAME)
 
+    with Trace(trace_name) as trace:
+        report(0.2, "Step 1: Removing no record rows / no record indeces....")
+        step_1(ctx)
+        dedup_records(ctx)
 
+        report(0.3, "Step 2: Generating spam code features....")
+        step_2(ctx, n_workers)
 
-############## STEP 7 ##############
-def step_7(modeling_df):
-    # print("\nStep 7: Predicting spam type....")
+        report(0.4, "Step 3: Calling spam code model....")
+        step_3(ctx)
 
-    sms_clf = joblib.load(SMS_SPAM_TYPE_CLF_PATH)
-    embeddings = pd.DataFrame(np.vstack(modeling_df['EMBEDDINGS'].values))
-    modeling_df['SPAM_TYPE_PRED_NUM'] = sms_clf.predict(embeddings)
-
-    modeling_df['SPAM_TYPE_PRED_WORD'] = modeling_df['SPAM_TYPE_PRED_NUM'].progress_apply(
-        lambda x: (
-            'COMMERCIAL'
-            if x == 0
-            else 'LOAN/SCAM/SPAM'
-            if x == 1
-            else 'P2P'
-        )
-    )
+        report(0.5, "Step 4: Determining spam code prediction....")
+        step_4(ctx)
 
+        report(0.6, "Step 5: Generating spam type features....")
+        step_5(ctx, n_workers)
 
-    label_mapping_df = modeling_df[['SPAM_TYPE_PRED_WORD', 'SPAM_TYPE_PRED_NUM']]
-    predicted_spam_type_indeces = label_mapping_df.index
+        report(0.7, "Step 6: Generating embeddings....")
+        step_6(ctx)
 
-    return predicted_spam_type_indeces, label_mapping_df
+        report(0.8, "Step 7: Predicting spam type....")
+        step_7(ctx)
 
+        report(1.0, "Step 8: Assigning labels....")
+        output_table = step_8(ctx)
 
+    record_trace(ctx, trace)
+    return output_table, ctx
 
 
-############## STEP 8 ##############
-def step_8(
-        spamshield_df,
-        spamcode_indeces,
-        url_indeces,
-        imsi_indeces,
-        no_record_indeces,
-        predicted_spam_type_indeces,
-        label_mapping_df
+def record_trace(ctx: PipelineContext, trace: Trace) -> None:
+    """Keeps the spans of a run in ctx.summary['spans'] and appends them to the span log"""
+    ctx.summary['spans'] = trace.to_dicts()
+    if SPAN_LOG_PATH:
+        trace.write_json(SPAN_LOG_PATH)
 
-    ):
 
-    # print("\nStep 8: Assigning labels....")
-    output_table = spamshield_df.copy()
 
-    # create col
-    # spam codes, url, imsi, no records
-    output_table.loc[
-        spamcode_indeces, 
-        'spam_tag'
-    ] = 'SPAM_CODE'
 
-    output_table.loc[
-        url_indeces, 
-        'spam_tag'
-    ] = 'URL_ONLY'
+############## STREAMING ##############
+# Large exports are tagged chunk by chunk: every chunk goes through steps 1-8 on its own,
+# and nothing but the process-wide caches outlives it, so peak memory follows the chunk
+# size. Duplicate texts are only collapsed within a chunk.
 
-    output_table.loc[
-        imsi_indeces, 
-        'spam_tag'
-    ] = 'IMSI_ONLY' 
+def read_chunks(path: str, chunk_rows: int = STREAM_CHUNK_ROWS, **read_kwargs) -> Iterator[pd.DataFrame]:
+    """Reads a CSV or Parquet file as frames of at most chunk_rows rows.
 
-    output_table.loc[
-        no_record_indeces, 
-        'spam_tag'
-    ] = 'NO_RECORD' 
+    CSV columns are read as text unless read_kwargs sets dtype, so a passthrough column has
+    the same type in every chunk however its values look in any one of them.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
 
-    output_table.loc[
-        predicted_spam_type_indeces, 
-        'spam_tag'
-    ] = label_mapping_df['SPAM_TYPE_PRED_WORD'].tolist()
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, **read_kwargs):
+            yield batch.to_pandas()
+    else:
+        read_kwargs.setdefault('dtype', str)
+        yield from pd.read_csv(path, chunksize=chunk_rows, **read_kwargs)
 
 
+def stream_taggings(chunks: Iterable[pd.DataFrame], n_workers=N_WORKERS) -> Iterator[pd.DataFrame]:
+    """Tags every chunk with steps 1-8, yielding each tagged chunk as soon as it is done"""
+    for chunk in chunks:
+        output_table, _ = run_steps(chunk, n_workers)
+        yield output_table
 
-    # print("\nPrediction complete!")
-    # print(output_table)
 
-    return output_table
+class TaggedOutputWriter:
+    """Appends tagged chunks to a CSV or Parquet file"""
+
+    def __init__(self, path: str) -> None:
+        """Initialize a writer; the file is created with the first chunk"""
+        self.path = path
+        self.rows = 0
+        self._parquet_writer = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """Appends one chunk"""
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                # a column with no values in the first chunk is stored as text
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                    for field in table.schema
+                ])
+                self._parquet_writer = pq.ParquetWriter(self.path, schema)
+            self._parquet_writer.write_table(self._conform(table))
+        else:
+            chunk.to_csv(self.path, mode='w' if self.rows == 0 else 'a',
+                         header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+
+
+    def _conform(self, table):
+        """Casts a chunk's columns to the file schema (e.g. all-null or int-with-nulls columns).
+
+        Raises before anything of the chunk is written if a column cannot be cast.
+        """
+        import pyarrow as pa
+
+        schema = self._parquet_writer.schema
+        columns = []
+        for field in schema:
+            column = table.column(field.name)
+            columns.append(column if column.type == field.type else column.cast(field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+
+    def close(self) -> None:
+        """Finishes the file"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+
+def tag_file(input_path: str,
+             output_path: str,
+             *,
+             chunk_rows: int = STREAM_CHUNK_ROWS,
+             n_workers=N_WORKERS,
+             text_col_name: str = RAW_TEXT_COL_NAME,
+             **read_kwargs) -> dict:
+    """Tags a CSV or Parquet file chunk by chunk, writing each tagged chunk as it is done.
+
+    text_col_name is the message column of the file, if it is not RAW_TEXT_COL_NAME.
+    """
+    start = time.perf_counter()
+    writer = TaggedOutputWriter(output_path)
+    spam_tag_counts = Counter()
+    n_chunks = 0
+
+    try:
+        chunks = (
+            chunk.rename(columns={text_col_name: RAW_TEXT_COL_NAME})
+            for chunk in read_chunks(input_path, chunk_rows, **read_kwargs)
+        )
+        for output_table in stream_taggings(chunks, n_workers):
+            writer.write(output_table.rename(columns={RAW_TEXT_COL_NAME: text_col_name}))
+            spam_tag_counts.update(output_table['spam_tag'].astype(str))
+            n_chunks += 1
+            print(f"Chunk {n_chunks}: {writer.rows} rows tagged "
+                  f"({time.perf_counter() - start:.1f}s)")
+    finally:
+        writer.close()
+
+    return {
+        'rows': writer.rows,
+        'chunks': n_chunks,
+        'spam_tags': dict(spam_tag_counts),
+        'seconds': time.perf_counter() - start,
+    }
 
 
 def pipeline():
@@ -314,34 +670,16 @@ def pipeline():
 
     spamshield_df = pd.DataFrame(data)
 
-    complete_records_spamshield_df, spamshield_df, no_record_indeces = step_1(spamshield_df)
-
-    spamcode_df = step_2(complete_records_spamshield_df)
-
-    spam_code_modeling_df, X = step_3(spamcode_df)
-
-    sms_no_spamcodes_df, spamcode_indeces = step_4(spam_code_modeling_df, X)
-
-    sms_no_spamcodes_no_url_no_imsi_df, imsi_indeces, url_indeces = step_5(sms_no_spamcodes_df)
+    output_table, ctx = run_steps(spamshield_df)
 
-    modeling_df = step_6(sms_no_spamcodes_no_url_no_imsi_df)
-
-    predicted_spam_type_indeces, label_mapping_df = step_7(modeling_df)
-
-    output_table = step_8(
-        spamshield_df,
-        spamcode_indeces,
-        url_indeces,
-        imsi_indeces,
-        no_record_indeces,
-        predicted_spam_type_indeces,
-        label_mapping_df
-
-    )
+    dedup_summary = ctx.summary['dedup']
+    print(f"Dedup: {dedup_summary['unique_rows']} distinct texts out of "
+          f"{dedup_summary['rows']} rows ({dedup_summary['dedup_ratio']:.1%} duplicates)")
+    print(f"Rows per cascade stage: {cascade_counts(ctx)}")
 
     # print("\nPipeline complete")
 
     
 
 if __name__ == '__main__':
-    pipeline()
\ No newline at end of file
+    pipeline()
@@ -0,0 +1,110 @@
+"""Cold-start import-time budget check for the Streamlit pages.
+
+Every page module is imported in a fresh interpreter with `python -X importtime`, and its
+total import time is compared against a budget. Run from the repo root:
+
+    python -m utils.import_budget
+    python -m utils.import_budget --budget-ms 1500 pages/predict_page.py
+"""
+
+# standard
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+
+#### CONFIGS ####
+DEFAULT_BUDGET_MS = 2500
+
+# pages that legitimately need more (streamlit itself is already ~1s)
+PAGE_BUDGETS_MS = {
+    'pages.predict_page': 3000,
+}
+
+# the heaviest imports to list for every page
+TOP_N_IMPORTS = 8
+
+
+def page_modules(pages_dir: str = 'pages') -> list[str]:
+    """Dotted module names of every page under pages_dir"""
+    return sorted(
+        '.'.join(path.with_suffix('').parts)
+        for path in Path(pages_dir).rglob('*.py')
+    )
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, str, float]]:
+    """Parses `-X importtime` output into (nesting level, module, cumulative ms) entries"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        name = name.rstrip()
+        level = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((level, name.strip(), int(cumulative_us) / 1000))
+    return entries
+
+
+def measure_import(module: str) -> dict:
+    """Imports a module in a fresh interpreter and returns its import-time breakdown"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import importlib; importlib.import_module({module!r})'],
+        capture_output=True,
+        text=True,
+        check=False
+    )
+
+    entries = parse_importtime(completed.stderr)
+    errors = [line for line in completed.stderr.splitlines()
+              if line.strip() and not line.startswith('import time:')]
+
+    return {
+        'module': module,
+        # a page that fails (e.g. needs st.secrets) still reports what it imported
+        'total_ms': sum(ms for level, _, ms in entries if level == 0),
+        'heaviest': sorted(((name, ms) for _, name, ms in entries),
+                           key=lambda entry: entry[1], reverse=True)[:TOP_N_IMPORTS],
+        'error': errors[-1] if completed.returncode != 0 and errors else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Measures every page and returns 1 if any page is over its budget"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*',
+                        help='page files or modules (default: every page under pages/)')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='budget for every page, overriding the configured budgets')
+    args = parser.parse_args(argv)
+
+    modules = [
+        '.'.join(Path(page).with_suffix('').parts) if page.endswith('.py') else page
+        for page in args.pages
+    ] or page_modules()
+
+    over_budget = []
+    for module in modules:
+        result = measure_import(module)
+        budget_ms = args.budget_ms or PAGE_BUDGETS_MS.get(module, DEFAULT_BUDGET_MS)
+        status = 'OK' if result['total_ms'] <= budget_ms else 'OVER'
+        if status == 'OVER':
+            over_budget.append(module)
+
+        print(f"{status:<4} {module:<45} {result['total_ms']:>8.0f} ms  (budget {budget_ms:.0f} ms)")
+        for name, ms in result['heaviest']:
+            print(f"       {name:<43} {ms:>8.0f} ms")
+        if result['error']:
+            print(f"       import stopped early: {result['error']}")
+
+    if over_budget:
+        print(f"\n{len(over_budget)} page(s) over budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
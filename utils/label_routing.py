@@ -0,0 +1,27 @@
+"""Vectorized assignment of spam tags from row selections and class predictions."""
+
+# third-party
+import numpy as np
+
+
+# spam type classifier classes, in class number order; any other number means P2P
+SPAM_TYPE_LABELS = np.array(['COMMERCIAL', 'LOAN/SCAM/SPAM', 'P2P'], dtype=object)
+
+
+def class_to_label(class_nums, labels: np.ndarray = SPAM_TYPE_LABELS) -> np.ndarray:
+    """Label of every class number, looked up in labels; unknown numbers get the last label"""
+    class_nums = np.asarray(class_nums)
+    known = np.isin(class_nums, np.arange(len(labels) - 1))
+    lookup = np.where(known, class_nums, len(labels) - 1).astype(np.int64)
+    return labels[lookup]
+
+
+def route_labels(initial: np.ndarray, routes: list[tuple[np.ndarray, object]]) -> np.ndarray:
+    """Applies (row positions, label or per-row labels) routes in order to a copy of initial.
+
+    A later route wins where the positions of two routes overlap.
+    """
+    labels = np.array(initial, dtype=object, copy=True)
+    for positions, values in routes:
+        labels[positions] = values
+    return labels
@@ -0,0 +1,144 @@
+"""Process-wide LRU memo of lemmatizer outputs, optionally persisted to disk."""
+
+# standard
+import atexit
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+#### CONFIGS ####
+DEFAULT_MAX_SIZE = 100_000
+
+
+class LemmaCache:
+    """Bounded LRU cache of lemmas keyed by (language, token).
+
+    English lemmas are cached per token. calamancy lemmas depend on the surrounding words,
+    so Filipino entries are keyed by the whole text that was lemmatized. Prediction jobs
+    in different threads share the cache, so every read and write of the LRU order holds
+    a lock.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Initialize an empty cache"""
+        self.max_size = max_size
+        self.path = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        """Number of cached lemmas"""
+        return len(self._entries)
+
+
+    def get(self, language: str, token: Hashable, default=None):
+        """Cached lemma of a token, counting the hit or miss"""
+        key = (language, token)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            return default
+
+
+    def put(self, language: str, token: Hashable, lemma) -> None:
+        """Stores a lemma, evicting the least recently used entries beyond max_size"""
+        with self._lock:
+            self._put((language, token), lemma)
+
+
+    def _put(self, key: tuple, lemma) -> None:
+        """Stores a lemma and evicts; the caller holds the lock"""
+        self._entries[key] = lemma
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+    def lemmatize(self, language: str, token: Hashable, func: Callable):
+        """Cached func(token); func runs outside the lock"""
+        missing = object()
+        lemma = self.get(language, token, missing)
+        if lemma is missing:
+            lemma = func(token)
+            self.put(language, token, lemma)
+        return lemma
+
+
+    def stats(self) -> dict:
+        """Hit and miss counts, hit rate and size since the process started"""
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'size': size,
+        }
+
+
+    ############## PERSISTENCE ##############
+    def attach(self, path: str) -> None:
+        """Persists the cache at path: loads it now (once) and saves it on exit"""
+        if self.path == path:
+            return
+
+        first_attach = self.path is None
+        self.path = path
+        self.load(path)
+        if first_attach:
+            atexit.register(self.save)
+
+
+    def load(self, path: str) -> None:
+        """Adds the entries saved at path, if the file exists"""
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding='utf-8') as file:
+            entries = json.load(file)
+
+        with self._lock:
+            for language, token, lemma in entries:
+                # json stores the Filipino token lists as lists
+                key = (language, token)
+                if key not in self._entries:
+                    self._put(key, lemma)
+
+
+    def save(self, path: str | None = None) -> None:
+        """Writes the entries to path (default: the attached path) atomically"""
+        path = path or self.path
+        if path is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            entries = [[language, token, lemma] for (language, token), lemma in self._entries.items()]
+
+        # several worker processes may save the same file; the last complete write wins
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp',
+                                         delete=False, encoding='utf-8') as file:
+            json.dump(entries, file)
+        os.replace(file.name, path)
+
+
+_lemma_cache = LemmaCache()
+
+
+def get_lemma_cache() -> LemmaCache:
+    """Returns the lemma cache shared by everything in this process"""
+    return _lemma_cache
@@ -0,0 +1,85 @@
+"""Process-wide registry of the tagging models, each loaded at most once.
+
+The registry lives at module level, so every Streamlit session served by the same process
+shares the same loaded models. `warm_up` loads them in a background thread, so the first
+prediction does not pay for loading.
+"""
+
+# standard
+import threading
+import time
+from typing import Callable
+
+
+class ModelRegistry:
+    """Named model loaders, run once on first use and cached for the life of the process"""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry"""
+        self._loaders = {}
+        self._models = {}
+        self._model_locks = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread = None
+
+        # seconds each model took to load
+        self.load_times = {}
+
+
+    def register(self, name: str, loader: Callable) -> None:
+        """Registers the function that loads a model; registering a name twice keeps the first"""
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._model_locks[name] = threading.Lock()
+
+
+    def get(self, name: str):
+        """The loaded model, loading it now unless another thread already has"""
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"No model registered as '{name}'")
+
+        # a second caller waits for the load in progress instead of starting its own
+        with self._model_locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = time.perf_counter() - start
+        return self._models[name]
+
+
+    def is_loaded(self, name: str) -> bool:
+        """Whether a model is already in memory"""
+        return name in self._models
+
+
+    def warm_up(self, names: list[str] | None = None) -> threading.Thread:
+        """Loads models (default: all) in a background thread, started once per process"""
+        with self._lock:
+            if self._warm_up_thread is None:
+                names = list(self._loaders) if names is None else names
+                self._warm_up_thread = threading.Thread(
+                    target=self._load_all, args=(names,), name='model-warm-up', daemon=True
+                )
+                self._warm_up_thread.start()
+        return self._warm_up_thread
+
+
+    def _load_all(self, names: list[str]) -> None:
+        """Loads every named model, reporting failures instead of raising"""
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # the next get() retries the load, and raises in the caller's thread
+                print(f"Warm-up of model '{name}' failed\nError: {e}")
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Returns the model registry shared by everything in this process"""
+    return _registry
@@ -0,0 +1,134 @@
+"""Process-pool execution for the row-independent stages of the tagging pipeline.
+
+Steps 2 and 5 only look at one row at a time, so a frame can be split into chunks,
+processed in worker processes and concatenated back in the original order.
+"""
+
+# standard
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# third-party
+import numpy as np
+import pandas as pd
+
+
+# frames smaller than this are processed in the calling process
+MIN_PARALLEL_ROWS = 2000
+
+# chunks per worker, so a slow chunk does not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+
+
+def _init_worker() -> None:
+    """Load the heavy per-process objects once, when a worker starts"""
+    # pylint: disable=import-outside-toplevel
+    from utils.spamcode_utils import URLEngine
+    from utils.spamtype_utils import TextPreprocessor
+
+    URLEngine.get_extractor()
+    TextPreprocessor.get_fil_nlp_model()
+
+
+def get_pool(n_workers: int) -> ProcessPoolExecutor:
+    """Returns the process-wide worker pool, (re)creating it for a new worker count"""
+    global _pool, _pool_workers  # pylint: disable=global-statement
+
+    if _pool is None or _pool_workers != n_workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(
+            max_workers=n_workers,
+            # workers are started fresh, since forking a threaded app (Streamlit) is unsafe
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        _pool_workers = n_workers
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stops the worker pool, if one is running"""
+    global _pool, _pool_workers  # pylint: disable=global-statement
+
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+    _pool, _pool_workers = None, 0
+
+
+atexit.register(shutdown_pool)
+
+
+def split_frame(df: pd.DataFrame, n_chunks: int) -> list[pd.DataFrame]:
+    """Splits a frame into at most n_chunks contiguous chunks, keeping its index"""
+    n_chunks = max(1, min(n_chunks, len(df)))
+    bounds = np.linspace(0, len(df), n_chunks + 1, dtype=int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def map_frame_chunks(func, df: pd.DataFrame, *, n_workers: int, **kwargs) -> pd.DataFrame:
+    """Runs func(chunk, **kwargs) over chunks of df in the worker pool.
+
+    Chunks are contiguous and results are concatenated in submission order, so the
+    output has the same row order and index as the input.
+    """
+    task = partial(func, **kwargs)
+
+    if n_workers <= 1 or len(df) < MIN_PARALLEL_ROWS:
+        return task(df)
+
+    chunks = split_frame(df, n_workers * CHUNKS_PER_WORKER)
+    results = list(get_pool(n_workers).map(task, chunks))
+
+    output = pd.concat(results, axis=0)
+    if not output.index.equals(df.index):
+        raise RuntimeError("Parallel chunks did not reassemble in the original order")
+    return output
+
+
+############## STAGES ##############
+# module-level functions, so they can be pickled and sent to the workers
+
+def apply_features_chunk(chunk: pd.DataFrame,
+                         *,
+                         raw_text_col_name: str,
+                         features=None,
+                         engine: str = 'rowwise') -> pd.DataFrame:
+    """Step 2 on one chunk: generate spam code features"""
+    # pylint: disable=import-outside-toplevel
+    from utils.spamcode_utils import SpamCodeModelFrame
+
+    spamcode_df = SpamCodeModelFrame(chunk, raw_text_col_name=raw_text_col_name)
+    return spamcode_df.apply_features(features, engine=engine)
+
+
+def clean_raw_text_chunk(chunk: pd.DataFrame,
+                         *,
+                         raw_text_col_name: str,
+                         fil_batch_size: int | None = 256,
+                         fil_n_process: int = 1,
+                         lemma_cache_path: str | None = None,
+                         translation_backend: str = 'googletrans',
+                         translation_cache_path: str | None = None,
+                         debug: bool = False,
+                         language_routing: bool = False) -> pd.DataFrame:
+    """Step 5 on one chunk: clean the raw text before generating embeddings"""
+    # pylint: disable=import-outside-toplevel
+    from utils.spamtype_utils import TextPreprocessor
+
+    text_cleaning_pipeline = TextPreprocessor(
+        chunk,
+        raw_text_col_name=raw_text_col_name,
+        fil_batch_size=fil_batch_size,
+        fil_n_process=fil_n_process,
+        lemma_cache_path=lemma_cache_path,
+        translation_backend=translation_backend,
+        translation_cache_path=translation_cache_path,
+        debug=debug,
+        language_routing=language_routing
+    )
+    return text_cleaning_pipeline.clean_raw_text()
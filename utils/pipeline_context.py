@@ -0,0 +1,132 @@
+"""Columnar state shared by the steps of the spam tagging pipeline.
+
+Columns are held as NumPy arrays rather than Arrow arrays. Every step produces NumPy
+(feature arrays, classifier predictions, the embedding matrix) and writes results into
+rows by position: label routing and the dedup fan-out scatter into arrays. Arrow arrays
+are immutable, so an Arrow-backed store would need a converting copy at every step
+boundary, which is the copying this context removes. pyarrow stays an optional I/O
+dependency, imported only to read and write Parquet.
+"""
+
+# third-party
+import numpy as np
+import pandas as pd
+
+
+class PipelineContext:
+    """Holds the input frame once, plus the columns and row selections each step adds.
+
+    The input frame is never copied or modified. A step reads only the columns it needs
+    for the rows of one selection, and stores the columns it produces for exactly those
+    rows. Rows are addressed by position, so duplicate or unordered index labels are safe.
+    """
+
+    def __init__(self, df: pd.DataFrame, *, raw_text_col_name: str) -> None:
+        """Initialize a context around the input frame"""
+        self.source = df
+        self.raw_text_col_name = raw_text_col_name
+        self.n_rows = len(df)
+
+        # selection name -> sorted row positions
+        self._selections = {'all': np.arange(self.n_rows)}
+
+        # column name -> (row positions, values for those positions)
+        self._columns = {}
+
+        # input column name -> its values, converted to NumPy on first use
+        self._source_arrays = {}
+
+        # run statistics reported by the steps, e.g. the dedup ratio
+        self.summary = {}
+
+
+    ############## SELECTIONS ##############
+    def select(self, name: str, positions) -> np.ndarray:
+        """Stores a named row selection, from positions or a boolean mask over all rows"""
+        positions = np.asarray(positions)
+        if positions.dtype == bool:
+            positions = np.flatnonzero(positions)
+        self._selections[name] = np.sort(positions.astype(np.int64))
+        return self._selections[name]
+
+
+    def positions(self, selection: str = 'all') -> np.ndarray:
+        """Row positions of a named selection"""
+        return self._selections[selection]
+
+
+    def select_where(self, name: str, selection: str, condition) -> np.ndarray:
+        """Stores the rows of `selection` for which the boolean `condition` holds"""
+        return self.select(name, self.positions(selection)[np.asarray(condition, dtype=bool)])
+
+
+    def has_selection(self, name: str) -> bool:
+        """Whether a named selection was stored"""
+        return name in self._selections
+
+
+    def index(self, selection: str = 'all') -> pd.Index:
+        """Index labels of the input frame for a named selection"""
+        return self.source.index[self.positions(selection)]
+
+
+    def size(self, selection: str = 'all') -> int:
+        """Number of rows in a named selection"""
+        return len(self.positions(selection))
+
+
+    ############## COLUMNS ##############
+    def add(self, name: str, values, selection: str = 'all') -> None:
+        """Stores a column computed for the rows of a selection"""
+        if isinstance(values, (pd.Series, pd.Index)):
+            values = values.to_numpy()
+        values = np.asarray(values)
+
+        positions = self.positions(selection)
+        if len(values) != len(positions):
+            raise ValueError(f"{name} has {len(values)} values for {len(positions)} rows")
+        self._columns[name] = (positions, values)
+
+
+    def add_frame(self, df: pd.DataFrame, columns: list[str], selection: str = 'all') -> None:
+        """Stores several columns of a frame computed for the rows of a selection"""
+        for name in columns:
+            self.add(name, df[name], selection)
+
+
+    def has(self, name: str) -> bool:
+        """Whether a column was computed by a step or exists in the input frame"""
+        return name in self._columns or name in self.source.columns
+
+
+    def source_array(self, name: str) -> np.ndarray:
+        """All values of an input column, converted once and kept for later reads"""
+        if name not in self._source_arrays:
+            self._source_arrays[name] = self.source[name].to_numpy()
+        return self._source_arrays[name]
+
+
+    def get(self, name: str, selection: str = 'all') -> np.ndarray:
+        """Values of a column for the rows of a selection"""
+        positions = self.positions(selection)
+
+        if name not in self._columns:
+            return self.source_array(name)[positions]
+
+        stored_positions, values = self._columns[name]
+        if stored_positions is positions or np.array_equal(stored_positions, positions):
+            return values
+
+        lookup = np.searchsorted(stored_positions, positions)
+        lookup = np.minimum(lookup, len(stored_positions) - 1)
+        if len(stored_positions) == 0 or not np.array_equal(stored_positions[lookup], positions):
+            raise KeyError(f"{name} was not computed for every row of '{selection}'")
+        return values[lookup]
+
+
+    def frame(self, columns: list[str], selection: str = 'all') -> pd.DataFrame:
+        """A new frame with only the given columns, for the rows of a selection"""
+        return pd.DataFrame(
+            {name: self.get(name, selection) for name in columns},
+            index=self.index(selection)
+        )
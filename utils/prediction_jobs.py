@@ -0,0 +1,151 @@
+"""Process-wide queue of prediction jobs, run by a shared pool of background threads.
+
+The Predict page submits a job and polls it, instead of running steps 1-8 inside the
+user's script run. Reruns and reloads of the page therefore do not lose the work. Every
+Streamlit session served by the process shares the pool and the loaded models.
+
+Jobs run in submission order, and each owner (a logged-in user) has at most one job
+queued or running at a time, so concurrent users take turns instead of competing for CPU.
+Jobs never touch Streamlit: they only report progress, and the page reads it.
+"""
+
+# standard
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+#### CONFIGS ####
+# jobs running at once; the rest wait in the queue
+PREDICTION_WORKERS = 1
+
+# finished jobs (and their results) are dropped this long after they finish
+JOB_RETENTION_S = 3600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class PredictionJob:
+    """State, progress and result of one submitted job"""
+
+    def __init__(self, owner: str, sequence: int) -> None:
+        """Initialize a queued job"""
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.sequence = sequence
+        self.status = QUEUED
+        self.progress = 0.0
+        self.progress_text = ''
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+        # set once the owner has picked up the result, so it is only applied once
+        self.collected = False
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job is done or failed"""
+        return self.status in (DONE, FAILED)
+
+    @property
+    def runtime_s(self) -> float | None:
+        """Seconds the job ran for, once it has finished"""
+        if self.finished_at is None or self.started_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def report(self, progress: float, text: str = '') -> None:
+        """Updates the progress (0 to 1) shown to whoever polls the job"""
+        self.progress = progress
+        self.progress_text = text
+
+
+class JobExecutor:
+    """Runs submitted jobs in a shared thread pool and keeps them until they expire"""
+
+    def __init__(self, n_workers: int = PREDICTION_WORKERS) -> None:
+        """Initialize an executor; its threads start with the first job"""
+        self._pool = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='prediction-job')
+        self._jobs = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+
+    def submit(self, owner: str, func: Callable, *args, **kwargs) -> PredictionJob:
+        """Queues func(job, *args, **kwargs), whose return value becomes job.result.
+
+        An owner with a job still queued or running gets that job back instead of a new one.
+        """
+        with self._lock:
+            self._drop_expired()
+            active = self.active_job(owner)
+            if active is not None:
+                return active
+
+            job = PredictionJob(owner, next(self._sequence))
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+
+    def _run(self, job: PredictionJob, func: Callable, args: tuple, kwargs: dict) -> None:
+        """Runs a job in a pool thread, recording its result or error"""
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = DONE
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # reported to the owner by the page that polls the job
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+
+    def _drop_expired(self) -> None:
+        """Forgets jobs that finished more than JOB_RETENTION_S ago"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > JOB_RETENTION_S:
+                del self._jobs[job_id]
+
+
+    def get(self, job_id: str | None) -> PredictionJob | None:
+        """A job by id, if it is still kept"""
+        return self._jobs.get(job_id) if job_id else None
+
+
+    def active_job(self, owner: str) -> PredictionJob | None:
+        """The owner's job that is queued or running, if any"""
+        return next((job for job in list(self._jobs.values())
+                     if job.owner == owner and not job.finished), None)
+
+
+    def latest_job(self, owner: str) -> PredictionJob | None:
+        """The owner's most recently submitted job, if any"""
+        jobs = [job for job in list(self._jobs.values()) if job.owner == owner]
+        return max(jobs, key=lambda job: job.sequence) if jobs else None
+
+
+    def queue_position(self, job: PredictionJob) -> int:
+        """Number of queued jobs that will start before this one"""
+        return sum(other.status == QUEUED and other.sequence < job.sequence
+                   for other in list(self._jobs.values()))
+
+
+_executor = JobExecutor()
+
+
+def get_job_executor() -> JobExecutor:
+    """Returns the job executor shared by everything in this process"""
+    return _executor
@@ -0,0 +1,200 @@
+"""Opt-in profiling of whole prediction runs.
+
+`profiled()` wraps a run in one of two profilers. When profiling is off it only checks a
+flag.
+
+- The sampling profiler reads the stack of the profiled thread every few milliseconds.
+  It writes collapsed stacks (`<name>.folded`), which flamegraph.pl, speedscope and
+  inferno open directly.
+- The deterministic profiler is cProfile. It writes a pstats dump (`<name>.prof`) for
+  snakeviz or flameprof.
+
+Both write a top-N summary of the hottest functions (`<name>-top.txt`). Both see everything
+the profiled thread runs, including the callbacks of `progress_apply`. Work done in worker
+processes or other threads is not profiled.
+
+Since Python 3.12 only one cProfile session can be active in a process, so deterministic
+runs (e.g. two prediction jobs) take turns.
+"""
+
+# standard
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+
+#### CONFIGS ####
+PROFILE_DIR = 'logs/profiles'
+PROFILE_MODES = ('sampling', 'deterministic')
+SAMPLE_INTERVAL_S = 0.005
+TOP_N = 25
+
+# held by the running deterministic profile; cProfile is process-wide on Python 3.12+
+_deterministic_lock = threading.Lock()
+
+# numbers the runs of this process, so that runs started in the same second get their own files
+_run_counter = itertools.count()
+
+
+def frame_label(code) -> str:
+    """Name of a code object in a collapsed stack: function (file:line)"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread from a background thread"""
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_S) -> None:
+        """Initialize a profiler of the calling thread"""
+        self.interval_s = interval_s
+        self.stacks = Counter()     # root-first tuple of frame labels -> samples
+        self.n_samples = 0
+        self.elapsed_s = 0.0
+
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._start = None
+
+
+    def start(self) -> None:
+        """Starts sampling"""
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._sampler.start()
+
+
+    def stop(self) -> None:
+        """Stops sampling"""
+        self._stop.set()
+        self._sampler.join()
+        self.elapsed_s = time.perf_counter() - self._start
+
+
+    def _sample(self) -> None:
+        """Records the stack of the profiled thread until stopped"""
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._thread_id)  # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.n_samples += 1
+
+
+    def write_folded(self, path: str) -> None:
+        """Writes the samples as collapsed stacks, one `frame;frame;frame count` line each"""
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(';'.join(label.replace(';', ':') for label in stack) + f' {count}\n')
+
+
+    def top(self, n: int = TOP_N) -> str:
+        """The n functions with the most samples in total, with their own (self) samples"""
+        total = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            for label in set(stack):
+                total[label] += count
+            own[stack[-1]] += count
+
+        seconds_per_sample = self.elapsed_s / self.n_samples if self.n_samples else 0.0
+        lines = [f"{self.n_samples} samples over {self.elapsed_s:.2f}s",
+                 f"{'total_s':>9} {'total%':>7} {'self_s':>9} {'self%':>7}  function"]
+        for label, count in total.most_common(n):
+            lines.append(
+                f"{count * seconds_per_sample:>9.3f} {count / self.n_samples:>7.1%} "
+                f"{own[label] * seconds_per_sample:>9.3f} {own[label] / self.n_samples:>7.1%}  {label}"
+            )
+        return '\n'.join(lines)
+
+
+class ProfileRun:
+    """Where the profile of one run was written, and its top-N summary"""
+
+    def __init__(self, name: str, mode: str) -> None:
+        """Initialize the record of a run about to be profiled"""
+        self.name = name
+        self.mode = mode
+        self.paths = []
+        self.summary = ''
+
+
+def _save_sampling(profiler: SamplingProfiler, run: ProfileRun, base_path: str) -> None:
+    """Writes the collapsed stacks and summary of a sampling run"""
+    profiler.write_folded(base_path + '.folded')
+    run.summary = profiler.top()
+    run.paths.append(base_path + '.folded')
+
+
+def _save_deterministic(profiler: cProfile.Profile, run: ProfileRun, base_path: str) -> None:
+    """Writes the pstats dump and summary of a cProfile run"""
+    profiler.dump_stats(base_path + '.prof')
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(TOP_N)
+    run.summary = stream.getvalue().strip()
+    run.paths.append(base_path + '.prof')
+
+
+@contextmanager
+def profiled(name: str, enabled: bool, *, mode: str = 'sampling', profile_dir: str = PROFILE_DIR):
+    """Profiles the block when enabled, yielding its ProfileRun (None when disabled).
+
+    The files are written to profile_dir when the block exits, even if it raised.
+    """
+    if not enabled:
+        yield None
+        return
+
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+
+    if mode == 'deterministic' and not _deterministic_lock.acquire(blocking=False):
+        print(f"Profiling of '{name}' is waiting for another deterministic profile to finish")
+        _deterministic_lock.acquire()
+
+    try:
+        run = ProfileRun(name, mode)
+        profiler = SamplingProfiler() if mode == 'sampling' else cProfile.Profile()
+        if mode == 'sampling':
+            profiler.start()
+        else:
+            profiler.enable()
+
+        try:
+            yield run
+        finally:
+            if mode == 'sampling':
+                profiler.stop()
+            else:
+                profiler.disable()
+
+            os.makedirs(profile_dir, exist_ok=True)
+            base_path = os.path.join(
+                profile_dir,
+                f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(_run_counter)}-"
+                f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}"
+            )
+            if mode == 'sampling':
+                _save_sampling(profiler, run, base_path)
+            else:
+                _save_deterministic(profiler, run, base_path)
+
+            with open(base_path + '-top.txt', 'w', encoding='utf-8') as file:
+                file.write(run.summary + '\n')
+            run.paths.append(base_path + '-top.txt')
+            print(f"Profile of '{name}' written to {', '.join(run.paths)}")
+    finally:
+        if mode == 'deterministic':
+            _deterministic_lock.release()
@@ -8,32 +8,100 @@ import string
 from collections import Counter
 
 # third-party
-import emoji
+import numpy as np
 import pandas as pd
 import regex
 from tqdm import tqdm
 from urlextract import URLExtract
 
+# local
+from utils.spans import span
+from utils.text_kernels import CodePointColumn, safe_ratio
+from utils.unicode_table import CJK, ODDITY, char_class_mask, has_char_class
+
 # initialize tqdm after import
 tqdm.pandas()
 
+# patterns shared by the row-wise and vectorized features
+PUNCTUATION_CHARS = frozenset(string.punctuation)
+CONSONANT_PATTERN = re.compile(r'(?i)[^aeiou\s\d\W_]+')
+IMSI_PATTERN = re.compile(r'imsi=\d+&uid=[A-Za-z0-9]+&t=\d+')
+URL_FRAGMENT_PATTERN = re.compile(r'\s*([.:/])\s*')
+URL_PREFILTER_PATTERN = re.compile(r'\.|localhost', re.IGNORECASE)
+SPAM_CODE_PATTERN = regex.compile(
+    r"^(?=[\p{L}\p{N}\p{S}\p{P}]{6,}$)"
+    r"[\p{L}\p{N}\p{S}\p{P}]*"
+    r"[\d𝟎-𝟗\U0001D7CE-\U0001D7FF]{3,7}$"
+)
+
+
+class URLEngine:
+    """Process-wide URL detector shared by HAS_URL and CLEANED_URL_STR.
+
+    The `URLExtract` instance (TLD list and its matcher) is built once per process, on
+    first use. Texts that cannot contain a URL are skipped before extraction.
+    """
+    _extractor = None
+
+    @classmethod
+    def get_extractor(cls) -> URLExtract:
+        """Returns the shared URL extractor, building it on first use"""
+        if cls._extractor is None:
+            cls._extractor = URLExtract()
+        return cls._extractor
+
+    @staticmethod
+    def may_contain_url(text: str) -> bool:
+        """Cheap pre-filter: every URL the extractor finds contains a dot or localhost"""
+        return URL_PREFILTER_PATTERN.search(text) is not None
+
+    @classmethod
+    def find_urls(cls, text: str) -> list[str]:
+        """Extract URLs from text, skipping the extractor when none are possible"""
+        if not cls.may_contain_url(text):
+            return []
+        return cls.get_extractor().find_urls(text)
+
+    @staticmethod
+    def replace_urls(text: str, urls: list[str]) -> str:
+        """Replace all extracted URLs with the placeholder word, url, then collapse spaces"""
+        # one URL at a time, in extraction order: a URL that also appears inside another
+        # match is replaced differently by a single alternation
+        for url in urls:
+            text = re.sub(re.escape(url), 'url', text)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    @classmethod
+    def scan(cls, text: str) -> tuple[int, str]:
+        """Returns (HAS_URL, CLEANED_URL_STR) for a text.
+
+        HAS_URL is defined on the raw text and CLEANED_URL_STR on the defragmented text.
+        Both come from one extraction only when defragmenting leaves the text unchanged.
+        Otherwise, which is the case for most messages containing '. ', the raw text is
+        extracted a second time, since HAS_URL is a spam code model input and must not change.
+        """
+        str_with_fixed_urls = URLCleaner.defragment_url_pieces(text)
+        fixed_urls = cls.find_urls(str_with_fixed_urls)
+
+        if str_with_fixed_urls == text:
+            has_url = int(bool(fixed_urls))
+        else:
+            has_url = int(bool(cls.find_urls(text)))
+
+        return has_url, cls.replace_urls(str_with_fixed_urls, fixed_urls)
+
 
 class URLCleaner:
     """Utility class for cleaning texts that contains URLs."""
     @staticmethod
     def defragment_url_pieces(text: str) -> str:
         """Remove spaces around ., :, / to reconstruct URLs"""
-        return re.sub(r'\s*([.:/])\s*', r'\1', text)
+        return URL_FRAGMENT_PATTERN.sub(r'\1', text)
 
     @staticmethod
     def remove_extracted_urls(text: str, urls: list[str]) -> str:
         """Replace all occurrences of extracted URLs in the text with the placeholder word, url"""
-        for url in urls:
-            # Escape the URL to safely use it in regex
-            pattern = re.escape(url)
-            text = re.sub(pattern, 'url', text)
-        # Optionally clean up extra spaces
-        return re.sub(r'\s+', ' ', text).strip()
+        return URLEngine.replace_urls(text, urls)
 
     @staticmethod
     def clean_str_with_url(text: str) -> str:
@@ -42,16 +110,24 @@ class URLCleaner:
         str_with_fixed_urls = URLCleaner.defragment_url_pieces(text)
 
         # extract url
-        extractor = URLExtract()
-        urls = extractor.find_urls(str_with_fixed_urls)
+        urls = URLEngine.find_urls(str_with_fixed_urls)
 
         # remove url and return string
         return URLCleaner.remove_extracted_urls(str_with_fixed_urls, urls)
 
 
 class SpamCodeModelFrame:
-    """A wrapper class around a pandas DataFrame for feature engineering on spam text data."""
+    """A wrapper class around a pandas DataFrame for feature engineering on spam text data.
+
+    Features and intermediates form a dependency graph. A feature is an output column; an
+    intermediate is a per-row value that several features share (e.g. the word count) and
+    is never written to the dataframe. Each node is computed at most once per
+    `apply_features` call, and only if a requested feature needs it.
+    """
     _feature_funcs = {}
+    _intermediate_funcs = {}
+    _vectorized_funcs = {}
+    _dependencies = {}
 
     def __init__(self, df: pd.DataFrame, *, raw_text_col_name: str = 'CONTENT') -> None:
         """Initialize a SpamCodeModelFrame"""
@@ -59,10 +135,37 @@ class SpamCodeModelFrame:
         self.raw_text_col_name = raw_text_col_name
 
     @classmethod
-    def add_feature(cls, *, feature_name: str):
-        """Class method decorator to register a feature extraction function"""
+    def add_feature(cls, *, feature_name: str, depends_on: tuple[str, ...] = ()):
+        """Class method decorator to register a feature extraction function
+
+        The function receives the text, plus one keyword argument per name in `depends_on`.
+        """
         def wrapper(func):
             cls._feature_funcs[feature_name] = func
+            cls._dependencies[feature_name] = tuple(depends_on)
+            return func
+        return wrapper
+
+    @classmethod
+    def add_intermediate(cls, *, name: str, depends_on: tuple[str, ...] = ()):
+        """Class method decorator to register a shared per-row value that features depend on"""
+        def wrapper(func):
+            cls._intermediate_funcs[name] = func
+            cls._dependencies[name] = tuple(depends_on)
+            return func
+        return wrapper
+
+    @classmethod
+    def add_vectorized_feature(cls, *, feature_name: str):
+        """Class method decorator to register a column-level version of a feature.
+
+        The decorated function receives a `CodePointColumn`, plus the column-level values of
+        the registered dependencies as keyword arguments, and returns one value per row.
+        It must produce the same values as the row-wise function registered under the
+        same `feature_name`. Intermediates can be registered the same way.
+        """
+        def wrapper(func):
+            cls._vectorized_funcs[feature_name] = func
             return func
         return wrapper
 
@@ -72,27 +175,212 @@ class SpamCodeModelFrame:
         return self.df
 
 
-    def apply_features(self, features = None) -> pd.DataFrame:
-        """Chooses features to apply to the dataframe, and show transformed df"""
+    def _requested_features(self, features) -> list[tuple]:
+        """Normalizes feature names or (name, func) pairs into (name, func) pairs"""
+        if not features:
+            return list(self._feature_funcs.items())
+
+        requested = []
+        for feature in features:
+            if isinstance(feature, str):
+                if feature not in self._feature_funcs:
+                    raise ValueError(f"Unknown feature: {feature}")
+                requested.append((feature, self._feature_funcs[feature]))
+            else:
+                requested.append(tuple(feature))
+        return requested
+
+
+    def _compute_node(self, name: str, values: dict, column, func=None):
+        """Computes a feature or intermediate once per run, after its dependencies.
+
+        A node runs vectorized when a column is given and it has a vectorized version, and
+        row-wise otherwise; a row-wise node gets the row-wise values of its dependencies.
+        A func other than the registered one is applied as func(text), row by row, without
+        the registered dependencies, and its values are not shared with other nodes.
+        """
+        registered_func = self._feature_funcs.get(name) or self._intermediate_funcs.get(name)
+        custom = func is not None and func is not registered_func
+        vectorized = column is not None and not custom and name in self._vectorized_funcs
+
+        key = (name, func) if custom else (name, vectorized)
+        if key in values:
+            return values[key]
+
+        with span(name, rows_in=len(self.df)) as node_span:
+            dependencies = {} if custom else {
+                dependency: self._compute_node(dependency, values, column if vectorized else None)
+                for dependency in self._dependencies.get(name, ())
+            }
+
+            if vectorized:
+                values[key] = self._vectorized_funcs[name](column, **dependencies)
+                node_span.rows_out = len(self.df)
+                return values[key]
+
+            func = func or registered_func
+            texts = self.df[self.raw_text_col_name]
+
+            if not dependencies:
+                values[key] = texts.progress_apply(func).tolist()
+            else:
+                dependency_names = list(dependencies)
+                rows = zip(texts, *dependencies.values())
+                values[key] = [
+                    func(text, **dict(zip(dependency_names, dependency_values)))
+                    for text, *dependency_values in tqdm(rows, total=len(texts))
+                ]
+            node_span.rows_out = len(self.df)
+            return values[key]
+
+
+    def apply_features(self,
+                       features = None,
+                       *,
+                       engine: str = 'rowwise',
+                       check_equivalence: bool = False) -> pd.DataFrame:
+        """Chooses features to apply to the dataframe, and show transformed df
+
+        `features` takes feature names or (name, func) pairs; by default every registered
+        feature is applied. Only the requested features and the nodes they depend on are
+        computed.
+
+        engine='rowwise' runs each feature function once per row. engine='vectorized'
+        computes every feature that has a column-level version over the whole column at
+        once, and falls back to the row-wise function for the rest; a (name, func) pair
+        with a func of its own always runs func(text) row-wise. With
+        check_equivalence=True the vectorized columns are compared against the row-wise
+        functions, and a ValueError is raised on any mismatch.
+        """
+        if engine not in ('rowwise', 'vectorized'):
+            raise ValueError(f"Unknown feature engine: {engine}")
 
         print("Setting CONTENT col to str dtype...\n")
         self.df[self.raw_text_col_name] = self.df[self.raw_text_col_name].astype(str)
 
-        features_to_apply = features or self._feature_funcs.items()
+        features_to_apply = self._requested_features(features)
 
+        column = None
+        if engine == 'vectorized':
+            print("Flattening CONTENT col into code points...\n")
+            column = CodePointColumn(self.df[self.raw_text_col_name])
+
+        # feature and intermediate values of this run, shared between features
+        values = {}
         for index, (name, func) in enumerate(features_to_apply, 1):
             print(f"Generating feature {index}: {name} column")
-            self.df[name] = self.df[self.raw_text_col_name].progress_apply(func)
+            self.df[name] = self._compute_node(name, values, column, func)
             print("\n")
 
-        if 'CAPITAL_LETTER_COUNT' in self.df.columns and 'WORD_COUNT' in self.df.columns:
-            self.df['AVG_CAPS_PER_WORD'] = (
-                self.df['CAPITAL_LETTER_COUNT'] / self.df['WORD_COUNT']
-            )
+        if engine == 'vectorized' and check_equivalence:
+            mismatches = {
+                name: count
+                for name, count in self.check_feature_equivalence(features_to_apply).items()
+                if count > 0
+            }
+            if mismatches:
+                raise ValueError(
+                    f"Vectorized features differ from the row-wise reference: {mismatches}"
+                )
 
         return self.df
 
 
+    def check_feature_equivalence(self, features = None) -> dict[str, int]:
+        """Recomputes vectorized features row by row and counts mismatching rows per feature"""
+        features_to_check = self._requested_features(features)
+        texts = self.df[self.raw_text_col_name].astype(str)
+
+        mismatch_counts = {}
+        for name, func in features_to_check:
+            if name not in self._vectorized_funcs or name not in self.df.columns:
+                continue
+
+            reference = texts.map(func).to_numpy()
+            computed = self.df[name].to_numpy()
+
+            if np.issubdtype(np.asarray(computed).dtype, np.number):
+                matches = np.isclose(computed.astype(np.float64),
+                                     reference.astype(np.float64),
+                                     rtol=1e-9, atol=1e-12, equal_nan=True)
+            else:
+                matches = computed == reference
+
+            mismatch_counts[name] = int((~matches).sum())
+
+        return mismatch_counts
+
+
+# ===== Shared intermediates =====
+@SpamCodeModelFrame.add_intermediate(name='non_space_chars')
+def get_non_space_chars(text: str) -> list[str]:
+    """List the characters of the text that are not whitespace."""
+    return [char for char in text if not char.isspace()]
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='non_space_chars')
+def get_non_space_chars_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `get_non_space_chars`: a mask over all positions."""
+    return ~column.char_mask(str.isspace)
+
+
+@SpamCodeModelFrame.add_intermediate(name='space_free_text')
+def get_space_free_text(text: str) -> str:
+    """Remove plain spaces (but no other whitespace) from the text."""
+    return text.replace(" ", "")
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='space_free_text')
+def get_space_free_text_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `get_space_free_text`: a mask over all positions."""
+    return ~column.char_mask(is_space_char)
+
+
+@SpamCodeModelFrame.add_intermediate(name='capital_letter_count')
+def count_capital_letters(text: str) -> int:
+    """Count the number of uppercase letters in the text."""
+    return sum(1 for c in text if c.isupper())
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='capital_letter_count')
+def count_capital_letters_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `count_capital_letters`."""
+    return column.count_per_row(column.char_mask(str.isupper))
+
+
+@SpamCodeModelFrame.add_intermediate(name='word_count')
+def count_words(text: str) -> int:
+    """Count the number of whitespace-separated words in the text."""
+    return len(text.split())
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='word_count')
+def count_words_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `count_words`."""
+    return column.token_count_per_row(column.char_mask(str.isspace))
+
+
+@SpamCodeModelFrame.add_intermediate(name='url_scan')
+def scan_urls(text: str) -> tuple[int, str]:
+    """One URL scan shared by HAS_URL and CLEANED_URL_STR."""
+    return URLEngine.scan(text)
+
+
+def is_space_char(char: str) -> bool:
+    """Check whether a single character is a plain space."""
+    return char == ' '
+
+
+def is_punctuation_char(char: str) -> bool:
+    """Check whether a single character is ASCII punctuation."""
+    return char in PUNCTUATION_CHARS
+
+
+def is_consonant_char(char: str) -> bool:
+    """Check whether a single character belongs to a consonant group."""
+    return CONSONANT_PATTERN.fullmatch(char) is not None
+
+
 # func 1
 @SpamCodeModelFrame.add_feature(feature_name='HAS_CJK')
 def is_cjk(text):
@@ -105,23 +393,23 @@ def is_cjk(text):
     Returns:
         int: 1 if the text contains CJK characters, 0 otherwise.
     """
-    cjk_ranges = [
-        (4352, 4607), (11904, 42191), (43072, 43135),
-        (44032, 55215), (63744, 64255), (65072, 65103),
-        (65381, 65500), (131072, 196607)
-    ]
-    return int(any(
-        any(start <= ord(char) <= end for start, end in cjk_ranges)
-        for char in text
-    ))
+    return int(has_char_class(text, CJK))
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='HAS_CJK')
+def is_cjk_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `is_cjk`."""
+    return column.any_per_row(char_class_mask(column.codepoints, CJK))
 
 
 
 # func 2
-@SpamCodeModelFrame.add_feature(feature_name='LETTER_TO_SYMBOL_RATIO')
-def get_alphabetic_ratio(text):
+@SpamCodeModelFrame.add_feature(feature_name='LETTER_TO_SYMBOL_RATIO',
+                                depends_on=('non_space_chars',))
+def get_alphabetic_ratio(text, non_space_chars=None):
     """Compute the ratio of alphabetic characters to all non-space characters."""
-    non_space_chars = [c for c in text if not c.isspace()]
+    if non_space_chars is None:
+        non_space_chars = get_non_space_chars(text)
     if not non_space_chars:
         return 0.0
 
@@ -129,60 +417,88 @@ def get_alphabetic_ratio(text):
     return letter_count / len(non_space_chars)
 
 
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='LETTER_TO_SYMBOL_RATIO')
+def get_alphabetic_ratio_vectorized(column: CodePointColumn, non_space_chars) -> np.ndarray:
+    """Column-level version of `get_alphabetic_ratio`."""
+    letters = non_space_chars & column.char_mask(str.isalpha)
+    return safe_ratio(column.count_per_row(letters), column.count_per_row(non_space_chars))
+
+
 
 # func 3
-@SpamCodeModelFrame.add_feature(feature_name='SPECIAL_CHAR_RATIO')
-def get_special_char_ratio(text):
+@SpamCodeModelFrame.add_feature(feature_name='SPECIAL_CHAR_RATIO',
+                                depends_on=('non_space_chars',))
+def get_special_char_ratio(text, non_space_chars=None):
     """ Compute the ratio of special (punctuation) characters to all non-space characters."""
     if not isinstance(text, str) or not text.strip():
         return 0.0
 
-    special_chars = set(string.punctuation)
-    non_space_chars = [char for char in text if not char.isspace()]
+    if non_space_chars is None:
+        non_space_chars = get_non_space_chars(text)
     if not non_space_chars:
         return 0.0
 
-    special_count = sum(1 for char in non_space_chars if char in special_chars)
+    special_count = sum(1 for char in non_space_chars if char in PUNCTUATION_CHARS)
     return special_count / len(non_space_chars)
 
 
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='SPECIAL_CHAR_RATIO')
+def get_special_char_ratio_vectorized(column: CodePointColumn, non_space_chars) -> np.ndarray:
+    """Column-level version of `get_special_char_ratio`."""
+    special = non_space_chars & column.char_mask(is_punctuation_char)
+    return safe_ratio(column.count_per_row(special), column.count_per_row(non_space_chars))
+
+
 
 # func 4
 @SpamCodeModelFrame.add_feature(feature_name='MAX_CONSEC_CONSONANTS')
 def max_consecutive_consonants(text):
     """Find the maximum length of consecutive consonant sequences in the text."""
     # Regex: match groups of consonants (exclude aeiou, case-insensitive)
-    consonant_groups = re.findall(r'(?i)[^aeiou\s\d\W_]+', text)
+    consonant_groups = CONSONANT_PATTERN.findall(text)
     if consonant_groups:
         return max(len(group) for group in consonant_groups)
     return 0
 
 
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='MAX_CONSEC_CONSONANTS')
+def max_consecutive_consonants_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `max_consecutive_consonants`."""
+    return column.max_run_per_row(column.char_mask(is_consonant_char))
+
+
 # func 5
 @SpamCodeModelFrame.add_feature(feature_name='HAS_IMSI_STR')
 def contains_imsi_uid_t(text):
     """Detect if text contains an IMSI/UID/T query string pattern."""
-    pattern = r'imsi=\d+&uid=[A-Za-z0-9]+&t=\d+'
-    return int(bool(re.search(pattern, text)))
+    return int(bool(IMSI_PATTERN.search(text)))
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='HAS_IMSI_STR')
+def contains_imsi_uid_t_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `contains_imsi_uid_t`."""
+    return column.texts.str.contains(IMSI_PATTERN, regex=True).to_numpy(dtype=np.int64)
 
 
 
 # func 6
-@SpamCodeModelFrame.add_feature(feature_name='HAS_URL')
-def contains_url(text):
+@SpamCodeModelFrame.add_feature(feature_name='HAS_URL', depends_on=('url_scan',))
+def contains_url(text, url_scan=None):
     """Detect if text contains at least one URL."""
-    extractor = URLExtract()
-    urls = extractor.find_urls(text)
+    if url_scan is not None:
+        return url_scan[0]
+
+    urls = URLEngine.find_urls(text)
     if urls:
         return 1
     return 0
 
 
 # func 7
-@SpamCodeModelFrame.add_feature(feature_name='DIGIT_RATIO')
-def get_digit_ratio(text):
+@SpamCodeModelFrame.add_feature(feature_name='DIGIT_RATIO', depends_on=('space_free_text',))
+def get_digit_ratio(text, space_free_text=None):
     """Compute the ratio of digit characters to total non-space characters."""
-    cleaned = text.replace(" ", "")
+    cleaned = get_space_free_text(text) if space_free_text is None else space_free_text
     total_chars = len(cleaned)
     if total_chars == 0:
         return 0.0
@@ -191,15 +507,33 @@ def get_digit_ratio(text):
     return digit_count / total_chars
 
 
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='DIGIT_RATIO')
+def get_digit_ratio_vectorized(column: CodePointColumn, space_free_text) -> np.ndarray:
+    """Column-level version of `get_digit_ratio`."""
+    digits = space_free_text & column.char_mask(str.isdigit)
+    return safe_ratio(column.count_per_row(digits), column.count_per_row(space_free_text))
+
+
 # func 8
-@SpamCodeModelFrame.add_feature(feature_name='CAPITAL_LETTER_TO_WORD_RATIO')
-def get_capital_letter_word_ratio(text):
+@SpamCodeModelFrame.add_feature(feature_name='CAPITAL_LETTER_TO_WORD_RATIO',
+                                depends_on=('capital_letter_count', 'word_count'))
+def get_capital_letter_word_ratio(text, capital_letter_count=None, word_count=None):
     """Compute the ratio of uppercase letters to total number of words."""
-    words = text.split()
-    if not words:
+    if word_count is None:
+        word_count = count_words(text)
+    if not word_count:
         return 0.0
-    capital_letters = sum(1 for c in text if c.isupper())
-    return capital_letters / len(words)
+    if capital_letter_count is None:
+        capital_letter_count = count_capital_letters(text)
+    return capital_letter_count / word_count
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='CAPITAL_LETTER_TO_WORD_RATIO')
+def get_capital_letter_word_ratio_vectorized(column: CodePointColumn,
+                                             capital_letter_count,
+                                             word_count) -> np.ndarray:
+    """Column-level version of `get_capital_letter_word_ratio`."""
+    return safe_ratio(capital_letter_count, word_count)
 
 
 # func 9
@@ -209,26 +543,60 @@ def get_char_length(text: str) -> int:
     return len(str(text)) if text is not None else 0
 
 
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='CHAR_LENGTH')
+def get_char_length_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `get_char_length`."""
+    return column.lengths
+
+
 # func 10
-@SpamCodeModelFrame.add_feature(feature_name='CAPITAL_LETTER_COUNT')
-def get_capital_letter_count(text):
+@SpamCodeModelFrame.add_feature(feature_name='CAPITAL_LETTER_COUNT',
+                                depends_on=('capital_letter_count',))
+def get_capital_letter_count(text, capital_letter_count=None):
     """Count the number of uppercase letters in the text."""
-    return sum(1 for c in text if c.isupper())
+    if capital_letter_count is None:
+        capital_letter_count = count_capital_letters(text)
+    return capital_letter_count
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='CAPITAL_LETTER_COUNT')
+def get_capital_letter_count_vectorized(column: CodePointColumn,
+                                        capital_letter_count) -> np.ndarray:
+    """Column-level version of `get_capital_letter_count`."""
+    return capital_letter_count
 
 
 # func 11
-@SpamCodeModelFrame.add_feature(feature_name='WORD_COUNT')
-def get_word_count(text):
+@SpamCodeModelFrame.add_feature(feature_name='WORD_COUNT', depends_on=('word_count',))
+def get_word_count(text, word_count=None):
     """Count the number of words in the text."""
-    return len(text.split())
+    if word_count is None:
+        word_count = count_words(text)
+    return word_count
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='WORD_COUNT')
+def get_word_count_vectorized(column: CodePointColumn, word_count) -> np.ndarray:
+    """Column-level version of `get_word_count`."""
+    return word_count
 
 
 
 # func 12
-@SpamCodeModelFrame.add_feature(feature_name='NON_SPACE_CHAR_LENGTH')
-def get_non_space_char_length(text):
+@SpamCodeModelFrame.add_feature(feature_name='NON_SPACE_CHAR_LENGTH',
+                                depends_on=('space_free_text',))
+def get_non_space_char_length(text, space_free_text=None):
     """Count the number of characters in the text excluding spaces."""
-    return len(text.replace(" ", ""))
+    if space_free_text is None:
+        space_free_text = get_space_free_text(text)
+    return len(space_free_text)
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='NON_SPACE_CHAR_LENGTH')
+def get_non_space_char_length_vectorized(column: CodePointColumn,
+                                         space_free_text) -> np.ndarray:
+    """Column-level version of `get_non_space_char_length`."""
+    return column.count_per_row(space_free_text)
 
 
 
@@ -238,12 +606,16 @@ def has_unicode_oddities(text):
     """Detect if text contains unusual Unicode characters """
 
     # shouldnt be an emoji, since spam codes dont contain emojis
-    special_chars = ''.join([char for char in text if ord(char) > 127
-                             and not emoji.is_emoji(char) and not is_cjk(char)])
-    if len(special_chars) > 0:
+    if has_char_class(text, ODDITY):
         return 1
     return 0
 
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='HAS_UNICODE_ODDITIES')
+def has_unicode_oddities_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `has_unicode_oddities`."""
+    return column.any_per_row(char_class_mask(column.codepoints, ODDITY))
+
 # func 14
 @SpamCodeModelFrame.add_feature(feature_name='CHAR_ENTROPY')
 def get_char_entropy(text):
@@ -265,25 +637,61 @@ def get_char_entropy(text):
 
     return entropy
 
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='CHAR_ENTROPY')
+def get_char_entropy_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `get_char_entropy`."""
+    return column.entropy_per_row(column.strip_mask(column.char_mask(str.isspace)))
+
 # func 15
 @SpamCodeModelFrame.add_feature(feature_name='REGEX_SPAM')
 def spam_code_matching(spamcode_string: str) -> int:
     """Detect if string matches a regex pattern typically used in spam codes."""""
-    pattern = (r"^(?=[\p{L}\p{N}\p{S}\p{P}]{6,}$)"
-               r"[\p{L}\p{N}\p{S}\p{P}]*"
-               r"[\d𝟎-𝟗\U0001D7CE-\U0001D7FF]{3,7}$"
-    )
+    return int(bool(SPAM_CODE_PATTERN.match(spamcode_string)))
 
-    return int(bool(regex.match(pattern, spamcode_string)))
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='REGEX_SPAM')
+def spam_code_matching_vectorized(column: CodePointColumn) -> np.ndarray:
+    """Column-level version of `spam_code_matching`."""
+    match = SPAM_CODE_PATTERN.match
+    return np.fromiter((bool(match(text)) for text in column.texts),
+                       dtype=np.int64, count=column.n_rows)
 
 
 # func 16
-@SpamCodeModelFrame.add_feature(feature_name='CLEANED_URL_STR')
-def clean_url_str(text: str) -> str:
+@SpamCodeModelFrame.add_feature(feature_name='CLEANED_URL_STR', depends_on=('url_scan',))
+def clean_url_str(text: str, url_scan=None) -> str:
     """Clean URLs from text and replacing them with placeholders."""
+    if url_scan is not None:
+        return url_scan[1]
     return URLCleaner.clean_str_with_url(text)
 
 
+# func 17
+@SpamCodeModelFrame.add_feature(feature_name='AVG_CAPS_PER_WORD',
+                                depends_on=('capital_letter_count', 'word_count'))
+def get_avg_caps_per_word(text, capital_letter_count=None, word_count=None):
+    """Compute uppercase letters per word, as inf (or NaN with no capitals) when there are
+    no words, like dividing the CAPITAL_LETTER_COUNT and WORD_COUNT columns."""
+    if capital_letter_count is None:
+        capital_letter_count = count_capital_letters(text)
+    if word_count is None:
+        word_count = count_words(text)
+
+    if word_count == 0:
+        return math.inf if capital_letter_count else math.nan
+    return capital_letter_count / word_count
+
+
+@SpamCodeModelFrame.add_vectorized_feature(feature_name='AVG_CAPS_PER_WORD')
+def get_avg_caps_per_word_vectorized(column: CodePointColumn,
+                                     capital_letter_count,
+                                     word_count) -> np.ndarray:
+    """Column-level version of `get_avg_caps_per_word`."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(capital_letter_count, dtype=np.float64) / word_count
+
+
 if __name__ == '__main__':
     sms_df = pd.read_csv('model/training_data_refined.csv').sample(800)
 
@@ -0,0 +1,163 @@
+"""Training- and evaluation-only helpers for the SMS spam type classifier.
+
+Kept apart from `spamtype_utils` so the inference path (the Predict page) never
+imports imblearn, matplotlib or the sklearn metrics.
+"""
+# pylint score - 9.59
+
+# Standard libraries
+from typing import Tuple
+
+# Third-party libraries
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import BorderlineSMOTE
+from sklearn.utils import resample
+import sklearn.metrics as skmetrics
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+import matplotlib.pyplot as plt
+
+
+
+
+def show_confusion_matrix(eval_df: pd.DataFrame,
+                          actual_col_name: str,
+                          predicted_col_name: str,
+                          wk_col_name: str,
+                          display_labels: dict | list,
+                          normalize: str | None = None):
+
+    """Display and evaluate confusion matrices from model predictions."""
+
+    if normalize:
+        title_suffix = "Normalized Confusion Matrix"
+        values_format = ".2f"
+    else:
+        title_suffix = "Raw Confusion Matrix"
+        values_format = "d"
+
+    if wk_col_name in eval_df.columns:
+        for wk in eval_df[wk_col_name].unique():
+
+            df = eval_df[eval_df[wk_col_name] == wk]
+
+            conf_matrix = skmetrics.confusion_matrix(
+                df[actual_col_name],
+                df[predicted_col_name],
+                normalize=normalize
+            )
+
+            disp = skmetrics.ConfusionMatrixDisplay(
+                confusion_matrix=conf_matrix,
+                display_labels=display_labels
+            )
+
+            # Calculate metrics
+            acc = accuracy_score(df[actual_col_name], df[predicted_col_name])
+            prec = precision_score(df[actual_col_name], df[predicted_col_name], average='macro')
+            rec = recall_score(df[actual_col_name], df[predicted_col_name], average='macro')
+            f1 = f1_score(df[actual_col_name], df[predicted_col_name], average='macro')
+
+            # Print all
+            print(f"Accuracy     : {acc:.4f}")
+            print(f"Precision    : {prec:.4f}")
+            print(f"Recall       : {rec:.4f}")
+            print(f"F1 Score     : {f1:.4f}")
+
+
+            disp.plot(xticks_rotation='vertical', values_format=values_format)
+            plt.title(f'{wk} -{title_suffix}')
+            plt.grid(False)
+
+    else:
+
+        conf_matrix = skmetrics.confusion_matrix(
+            eval_df[actual_col_name],
+            eval_df[predicted_col_name],
+            normalize=normalize
+        )
+
+        disp = skmetrics.ConfusionMatrixDisplay(
+            confusion_matrix=conf_matrix,
+            display_labels=display_labels
+        )
+
+        # Calculate metrics
+        acc = accuracy_score(eval_df[actual_col_name],
+                             eval_df[predicted_col_name])
+
+        prec = precision_score(eval_df[actual_col_name],
+                               eval_df[predicted_col_name],
+                               average='macro')
+
+        rec = recall_score(eval_df[actual_col_name],
+                           eval_df[predicted_col_name],
+                           average='macro')
+
+        f1 = f1_score(eval_df[actual_col_name],
+                      eval_df[predicted_col_name],
+                      average='macro')
+
+        # Print all
+        print(f"Accuracy     : {acc:.4f}")
+        print(f"Precision    : {prec:.4f}")
+        print(f"Recall       : {rec:.4f}")
+        print(f"F1 Score     : {f1:.4f}")
+
+
+        disp.plot(xticks_rotation='vertical', values_format=values_format)
+        plt.title(f'{title_suffix}')
+        plt.grid(False)
+
+
+
+class CustomSampler(BorderlineSMOTE):
+    """Custom resampling strategy that combines undersampling of the majority class
+    with Borderline-SMOTE oversampling of the minority class."""
+
+    def __init__(self, random_state=None):
+        """Initialize custom sampler"""
+        super().__init__()
+        self.random_state = random_state
+
+    def fit_resample(self, X: np.ndarray,
+                     y: pd.Series,
+                     *_args,
+                     **_kwargs) -> Tuple[np.ndarray, pd.Series]:
+
+        """Resample the dataset according to the custom strategy."""
+        X = pd.DataFrame(X) if not isinstance(X, pd.DataFrame) else X
+        y = pd.Series(y) if not isinstance(y, pd.Series) else y
+
+        class_counts = y.value_counts().sort_values(ascending=False)
+        majority_class = class_counts.index[0]
+        second_highest_count = class_counts.iloc[1]
+        minority_class = class_counts.index[-1]
+        second_lowest_count = class_counts.iloc[-2]
+
+        # Downsample majority to second highest count
+        downsample_target = int(second_highest_count)
+        x_majority = X[y == majority_class]
+        y_majority = y[y == majority_class]
+        x_majority_down, y_majority_down = resample(
+            x_majority, y_majority,
+            replace=False,
+            n_samples=downsample_target,
+            random_state=self.random_state
+        )
+
+        # Combine with other classes (not yet oversampled)
+        x_rest = X[y != majority_class]
+        y_rest = y[y != majority_class]
+        x_temp = pd.concat([x_majority_down, x_rest], axis=0)
+        y_temp = pd.concat([y_majority_down, y_rest], axis=0)
+
+        # Upsample minority to 125% of second-lowest count
+        smote_target = int(second_lowest_count * 1.25)
+        smote = BorderlineSMOTE(
+            sampling_strategy={minority_class: smote_target},
+            random_state=self.random_state
+        )
+        x_final, y_final = smote.fit_resample(x_temp, y_temp)
+
+        return x_final, y_final
@@ -1,26 +1,29 @@
-"""Utilities for preprocessing SMS text data, sampling class imbalance, and evaluating models."""
+"""Utilities for preprocessing SMS text data before generating embeddings.
+
+Sampling and evaluation helpers live in `spamtype_training`. Heavy dependencies
+(calamancy, nltk, googletrans, cleantext) are imported on first use, so importing this
+module stays cheap.
+"""
 # pylint score - 9.59
+# pylint: disable=import-outside-toplevel
 
 # Standard libraries
 import re
-from typing import Tuple
+import time
+from collections import Counter
+from contextlib import contextmanager
 
 # Third-party libraries
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-import calamancy
-from cleantext import remove_emoji
-from googletrans import Translator
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords as nltk_stopwords
-from stopwordsiso import stopwords as iso_stopwords
-from imblearn.over_sampling import BorderlineSMOTE
-from sklearn.utils import resample
-import sklearn.metrics as skmetrics
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-import matplotlib.pyplot as plt
+
+# Local/project imports
+from utils.lemma_cache import get_lemma_cache
+from utils.model_registry import get_model_registry
+from utils.spans import span
+from utils.translation import DEFAULT_BACKEND, get_translator
+from utils.unicode_table import CJK, EMOJI_PART, has_char_class, has_char_class_per_row
 
 # Configure tqdm after imports
 tqdm.pandas()
@@ -28,188 +31,138 @@ tqdm.pandas()
 
 
 
-def show_confusion_matrix(eval_df: pd.DataFrame,
-                          actual_col_name: str,
-                          predicted_col_name: str,
-                          wk_col_name: str,
-                          display_labels: dict | list,
-                          normalize: str | None = None):
-
-    """Display and evaluate confusion matrices from model predictions."""
-
-    if normalize:
-        title_suffix = "Normalized Confusion Matrix"
-        values_format = ".2f"
-    else:
-        title_suffix = "Raw Confusion Matrix"
-        values_format = "d"
-
-    if wk_col_name in eval_df.columns:
-        for wk in eval_df[wk_col_name].unique():
-
-            df = eval_df[eval_df[wk_col_name] == wk]
-
-            conf_matrix = skmetrics.confusion_matrix(
-                df[actual_col_name],
-                df[predicted_col_name],
-                normalize=normalize
-            )
-
-            disp = skmetrics.ConfusionMatrixDisplay(
-                confusion_matrix=conf_matrix,
-                display_labels=display_labels
-            )
-
-            # Calculate metrics
-            acc = accuracy_score(df[actual_col_name], df[predicted_col_name])
-            prec = precision_score(df[actual_col_name], df[predicted_col_name], average='macro')
-            rec = recall_score(df[actual_col_name], df[predicted_col_name], average='macro')
-            f1 = f1_score(df[actual_col_name], df[predicted_col_name], average='macro')
-
-            # Print all
-            print(f"Accuracy     : {acc:.4f}")
-            print(f"Precision    : {prec:.4f}")
-            print(f"Recall       : {rec:.4f}")
-            print(f"F1 Score     : {f1:.4f}")
-
-
-            disp.plot(xticks_rotation='vertical', values_format=values_format)
-            plt.title(f'{wk} -{title_suffix}')
-            plt.grid(False)
-
-    else:
-
-        conf_matrix = skmetrics.confusion_matrix(
-            eval_df[actual_col_name],
-            eval_df[predicted_col_name],
-            normalize=normalize
-        )
-
-        disp = skmetrics.ConfusionMatrixDisplay(
-            confusion_matrix=conf_matrix,
-            display_labels=display_labels
-        )
-
-        # Calculate metrics
-        acc = accuracy_score(eval_df[actual_col_name],
-                             eval_df[predicted_col_name])
-
-        prec = precision_score(eval_df[actual_col_name],
-                               eval_df[predicted_col_name],
-                               average='macro')
-
-        rec = recall_score(eval_df[actual_col_name],
-                           eval_df[predicted_col_name],
-                           average='macro')
-
-        f1 = f1_score(eval_df[actual_col_name],
-                      eval_df[predicted_col_name],
-                      average='macro')
-
-        # Print all
-        print(f"Accuracy     : {acc:.4f}")
-        print(f"Precision    : {prec:.4f}")
-        print(f"Recall       : {rec:.4f}")
-        print(f"F1 Score     : {f1:.4f}")
-
-
-        disp.plot(xticks_rotation='vertical', values_format=values_format)
-        plt.title(f'{title_suffix}')
-        plt.grid(False)
-
-
-
-class CustomSampler(BorderlineSMOTE):
-    """Custom resampling strategy that combines undersampling of the majority class
-    with Borderline-SMOTE oversampling of the minority class."""
-
-    def __init__(self, random_state=None):
-        """Initialize custom sampler"""
-        super().__init__()
-        self.random_state = random_state
-
-    def fit_resample(self, X: np.ndarray,
-                     y: pd.Series,
-                     *_args,
-                     **_kwargs) -> Tuple[np.ndarray, pd.Series]:
-
-        """Resample the dataset according to the custom strategy."""
-        X = pd.DataFrame(X) if not isinstance(X, pd.DataFrame) else X
-        y = pd.Series(y) if not isinstance(y, pd.Series) else y
-
-        class_counts = y.value_counts().sort_values(ascending=False)
-        majority_class = class_counts.index[0]
-        second_highest_count = class_counts.iloc[1]
-        minority_class = class_counts.index[-1]
-        second_lowest_count = class_counts.iloc[-2]
-
-        # Downsample majority to second highest count
-        downsample_target = int(second_highest_count)
-        x_majority = X[y == majority_class]
-        y_majority = y[y == majority_class]
-        x_majority_down, y_majority_down = resample(
-            x_majority, y_majority,
-            replace=False,
-            n_samples=downsample_target,
-            random_state=self.random_state
-        )
-
-        # Combine with other classes (not yet oversampled)
-        x_rest = X[y != majority_class]
-        y_rest = y[y != majority_class]
-        x_temp = pd.concat([x_majority_down, x_rest], axis=0)
-        y_temp = pd.concat([y_majority_down, y_rest], axis=0)
-
-        # Upsample minority to 125% of second-lowest count
-        smote_target = int(second_lowest_count * 1.25)
-        smote = BorderlineSMOTE(
-            sampling_strategy={minority_class: smote_target},
-            random_state=self.random_state
-        )
-        x_final, y_final = smote.fit_resample(x_temp, y_temp)
-
-        return x_final, y_final
-
-
-
 class TextPreprocessor:
     """Text preprocessing pipeline for cleaning, normalizing, and preparing text data
     for downstream NLP tasks such as embeddings or classification."""
 
-    _fil_nlp_model = calamancy.load("tl_calamancy_md-0.2.0")
-    en_stopwords = set(nltk_stopwords.words('english'))
-    fil_stopwords = set(iso_stopwords("tl"))
-    stopwords = en_stopwords.union(fil_stopwords)
-
-    def __init__(self, df: pd.DataFrame, *, raw_text_col_name: str = 'CONTENT') -> None:
-        """Initialize text preprocessor"""
+    FIL_NLP_MODEL_NAME = "tl_calamancy_md-0.2.0"
+
+    # name of the calamancy pipeline in the process-wide model registry
+    FIL_NLP_MODEL_KEY = 'fil_nlp_model'
+
+    # calamancy components that lemmas do not depend on
+    FIL_LEMMA_DISABLED_PIPES = ('parser', 'ner')
+
+    # the only splits word_tokenize makes in text of letters and whitespace
+    CLEANED_TEXT_CONTRACTIONS = {
+        'cannot': ('can', 'not'),
+        'gimme': ('gim', 'me'),
+        'gonna': ('gon', 'na'),
+        'gotta': ('got', 'ta'),
+        'lemme': ('lem', 'me'),
+        'wanna': ('wan', 'na'),
+    }
+
+    # language routes: which lemmatizers a message goes through
+    LANGUAGE_EN = 'en'          # WordNet only
+    LANGUAGE_FIL = 'fil'        # calamancy only
+    LANGUAGE_MIXED = 'mixed'    # both, like every message without routing
+
+    # Filipino text is vowel heavy: 'a' alone is about a fifth of its letters, and under a
+    # tenth in English
+    FIL_MIN_A_SHARE = 0.15
+
+    # loaded on first use, then shared by every instance in the process
+    _en_lemmatizer = None
+    _stopword_sets = None
+
+    def __init__(self,
+                 df: pd.DataFrame,
+                 *,
+                 raw_text_col_name: str = 'CONTENT',
+                 fil_batch_size: int | None = 256,
+                 fil_n_process: int = 1,
+                 lemma_cache_path: str | None = None,
+                 translation_backend: str = DEFAULT_BACKEND,
+                 translation_cache_path: str | None = None,
+                 debug: bool = False,
+                 language_routing: bool = False) -> None:
+        """Initialize text preprocessor
+
+        fil_batch_size sets how many texts calamancy lemmatizes per `nlp.pipe` batch;
+        None lemmatizes one row at a time. fil_n_process > 1 lets spaCy spread the
+        batches over that many processes. lemma_cache_path persists the process-wide
+        lemma cache, so a restarted worker starts with a warm vocabulary.
+        translation_backend names the backend that translates CJK rows ('googletrans', or
+        'local' to run offline) and translation_cache_path persists its translations.
+        debug keeps every intermediate column of clean_raw_text, not only TEXT_FINAL.
+        language_routing skips the lemmatizer a message does not need (see detect_language).
+        """
         self.df = df
         self.raw_text_col_name = raw_text_col_name
+        self.debug = debug
+        self.language_routing = language_routing
+
+        # messages per language route, from the latest run
+        self.routing_counts = {}
+        self.fil_batch_size = fil_batch_size
+        self.fil_n_process = fil_n_process
+
+        if lemma_cache_path:
+            get_lemma_cache().attach(lemma_cache_path)
+
+        self.translator = get_translator(translation_backend, cache_path=translation_cache_path)
+
+        # rows per second of every clean_raw_text stage, from the latest run
+        self.stage_throughput = {}
 
 
     def display_dataframe(self) -> pd.DataFrame:
         """Displays current dataframe without applying any transformations"""
         return self.df
 
+    @classmethod
+    def load_fil_nlp_model(cls):
+        """Loads the calamancy pipeline used for Filipino lemmatization"""
+        import calamancy
+        return calamancy.load(cls.FIL_NLP_MODEL_NAME)
+
+    @classmethod
+    def get_fil_nlp_model(cls):
+        """Returns the calamancy pipeline, loaded once per process through the model registry"""
+        registry = get_model_registry()
+        registry.register(cls.FIL_NLP_MODEL_KEY, cls.load_fil_nlp_model)
+        return registry.get(cls.FIL_NLP_MODEL_KEY)
+
+    @classmethod
+    def get_en_lemmatizer(cls):
+        """Returns the WordNet lemmatizer, creating it once"""
+        if cls._en_lemmatizer is None:
+            from nltk.stem import WordNetLemmatizer
+            cls._en_lemmatizer = WordNetLemmatizer()
+        return cls._en_lemmatizer
+
+    @classmethod
+    def get_stopword_sets(cls) -> dict[str, set]:
+        """Returns the English, Filipino and combined stopword sets, loading them once"""
+        if cls._stopword_sets is None:
+            from nltk.corpus import stopwords as nltk_stopwords
+            from stopwordsiso import stopwords as iso_stopwords
+
+            en_stopwords = set(nltk_stopwords.words('english'))
+            fil_stopwords = set(iso_stopwords("tl"))
+            cls._stopword_sets = {
+                'en': en_stopwords,
+                'fil': fil_stopwords,
+                'all': en_stopwords.union(fil_stopwords),
+                'en_only': en_stopwords - fil_stopwords,
+                'fil_only': fil_stopwords - en_stopwords
+            }
+        return cls._stopword_sets
+
     @staticmethod
     def is_cjk(text: str) -> int:
         """"Checks whether text contains a CJK character
             Returns 1 if yes, else 0"""
 
-        cjk_ranges = [
-            (4352, 4607), (11904, 42191), (43072, 43135),
-            (44032, 55215), (63744, 64255), (65072, 65103),
-            (65381, 65500), (131072, 196607)
-        ]
-        return int(any(
-            any(start <= ord(char) <= end for start, end in cjk_ranges)
-            for char in str(text)
-        ))
+        return int(has_char_class(str(text), CJK))
 
 
     @staticmethod
     def translate_to_en(text):
         """Translates text to english"""
+        from googletrans import Translator
+
         translator = Translator()
         result = translator.translate(text, dest='en')
         return result.text
@@ -233,6 +186,26 @@ class TextPreprocessor:
             return text
 
 
+    def translate_cjk_rows(self, has_cjk=None) -> pd.Series:
+        """Translates every row with CJK characters to english, batched and cached"""
+        texts = self.df[self.raw_text_col_name]
+        if has_cjk is None:
+            has_cjk = self.df['HAS_CJK']
+
+        needs_translation = (
+            (np.asarray(has_cjk) == 1)
+            & texts.notna().to_numpy()
+            & (texts.astype(str).str.strip() != '').to_numpy()
+        )
+
+        translated = texts.astype(object).copy()
+        if needs_translation.any():
+            translated.iloc[np.flatnonzero(needs_translation)] = self.translator.translate(
+                texts[needs_translation].tolist(), dest='en'
+            )
+        return translated
+
+
     @staticmethod
     def text_cleaning(text):
         """Removes \n, emojis, symbols, digits, excess spaces"""
@@ -240,8 +213,10 @@ class TextPreprocessor:
         text = text.replace("\n", " ")
         text = re.sub(r'\n{2,}', ' ', text)
 
-        # remove emojis
-        text = remove_emoji(text)
+        # remove emojis (only texts with a character that can be part of an emoji)
+        if has_char_class(text, EMOJI_PART):
+            from cleantext import remove_emoji
+            text = remove_emoji(text)
 
         # remove symbols and digits
         text = re.sub(r'[^A-Za-z\s]', ' ', text)
@@ -255,10 +230,30 @@ class TextPreprocessor:
         return text.lower().strip()
 
 
+    @staticmethod
+    def tokenize(text: str) -> list:
+        """Splits text into word tokens"""
+        from nltk.tokenize import word_tokenize
+
+        return word_tokenize(text)
+
+
+    @staticmethod
+    def tokenize_cleaned_text(text: str) -> list:
+        """Same tokens as `tokenize`, for text that only has letters and whitespace left
+        (the output of `text_cleaning`), without running the Punkt and Treebank tokenizers"""
+        contractions = TextPreprocessor.CLEANED_TEXT_CONTRACTIONS
+        tokens = []
+        for token in text.split():
+            tokens.extend(contractions.get(token, (token,)))
+        return tokens
+
+
     @staticmethod
     def remove_stopwords(token_list: list) -> list:
         """Filters out stopwords from token list"""
-        return [token for token in token_list if token.lower() not in TextPreprocessor.stopwords]
+        stopwords = TextPreprocessor.get_stopword_sets()['all']
+        return [token for token in token_list if token.lower() not in stopwords]
 
 
     @staticmethod
@@ -270,114 +265,260 @@ class TextPreprocessor:
     @staticmethod
     def lemmatize_en_tokens(token_list: list) -> list:
         """Returns the lemmatized word of each token"""
-        lemmatizer = WordNetLemmatizer()
-        return [lemmatizer.lemmatize(token) for token in token_list]
+        lemmatize = TextPreprocessor.get_en_lemmatizer().lemmatize
+        lemma_cache = get_lemma_cache()
+        return [lemma_cache.lemmatize('en', token, lemmatize) for token in token_list]
+
+    @staticmethod
+    def filter_and_lemmatize_en(tokens: list, *, lemmatize_en: bool = True) -> str:
+        """remove_stopwords through lemmatize_en_tokens in one pass, joined like TEXT_EN_LEMMATIZED"""
+        stopwords = TextPreprocessor.get_stopword_sets()['all']
+
+        # cleaned text is already lowercase, and the stopword and length filters commute
+        kept = (token for token in tokens if len(token) > 2 and token not in stopwords)
+        if not lemmatize_en:
+            return ' '.join(kept)
+
+        lemmatize = TextPreprocessor.get_en_lemmatizer().lemmatize
+        lemma_cache = get_lemma_cache()
+        return ' '.join(lemma_cache.lemmatize('en', token, lemmatize) for token in kept)
+
+    @staticmethod
+    def clean_and_lemmatize_en(text: str) -> str:
+        """text_cleaning through lemmatize_en_tokens in one pass, joined like TEXT_EN_LEMMATIZED"""
+        tokens = TextPreprocessor.tokenize_cleaned_text(TextPreprocessor.text_cleaning(text))
+        return TextPreprocessor.filter_and_lemmatize_en(tokens)
+
+    @staticmethod
+    def detect_language(tokens: list) -> str:
+        """Routes the tokens of a cleaned message to LANGUAGE_EN, LANGUAGE_FIL or LANGUAGE_MIXED.
+
+        Stopwords that belong to only one of the two languages are the main signal, and the
+        share of 'a' among the letters breaks ties. Anything without clear evidence is mixed,
+        which runs both lemmatizers like before.
+        """
+        stopword_sets = TextPreprocessor.get_stopword_sets()
+        en_hits = sum(token in stopword_sets['en_only'] for token in tokens)
+        fil_hits = sum(token in stopword_sets['fil_only'] for token in tokens)
+
+        n_letters = sum(map(len, tokens))
+        a_share = sum(token.count('a') for token in tokens) / n_letters if n_letters else 0.0
+
+        if en_hits and not fil_hits and a_share < TextPreprocessor.FIL_MIN_A_SHARE:
+            return TextPreprocessor.LANGUAGE_EN
+        if fil_hits and not en_hits and a_share >= TextPreprocessor.FIL_MIN_A_SHARE:
+            return TextPreprocessor.LANGUAGE_FIL
+        return TextPreprocessor.LANGUAGE_MIXED
+
+    @classmethod
+    def fil_lemma_disabled_pipes(cls) -> list[str]:
+        """Components of the loaded calamancy pipeline to skip when only lemmas are needed"""
+        nlp = cls.get_fil_nlp_model()
+        return [name for name in cls.FIL_LEMMA_DISABLED_PIPES if name in nlp.pipe_names]
 
     @staticmethod
     def lemmatize_fil_tokens(text: str) -> list:
         """Returns lemmatized filipino words if applicable"""
-        doc = TextPreprocessor._fil_nlp_model(text)
-        return [token.lemma_ for token in doc]
+        def lemmatize(text: str) -> list:
+            nlp = TextPreprocessor.get_fil_nlp_model()
+            with nlp.select_pipes(disable=TextPreprocessor.fil_lemma_disabled_pipes()):
+                doc = nlp(text)
+            return [token.lemma_ for token in doc]
 
+        return get_lemma_cache().lemmatize('fil', text, lemmatize)
 
+    @staticmethod
+    def lemmatize_fil_texts(texts: list[str], *, batch_size: int = 256, n_process: int = 1) -> list:
+        """Returns lemmatized filipino words of every text, streaming them through nlp.pipe
+
+        Only texts missing from the lemma cache are sent to calamancy, each one once.
+        """
+        lemma_cache = get_lemma_cache()
+        lemmas = [lemma_cache.get('fil', text) for text in texts]
+        missing = list(dict.fromkeys(text for text, lemma in zip(texts, lemmas) if lemma is None))
+
+        if missing:
+            nlp = TextPreprocessor.get_fil_nlp_model()
+            docs = nlp.pipe(
+                missing,
+                batch_size=batch_size,
+                n_process=n_process,
+                disable=TextPreprocessor.fil_lemma_disabled_pipes()
+            )
+            computed = {}
+            for text, doc in zip(missing, tqdm(docs, total=len(missing))):
+                computed[text] = [token.lemma_ for token in doc]
+                lemma_cache.put('fil', text, computed[text])
+
+            lemmas = [lemma if lemma is not None else computed[text]
+                      for text, lemma in zip(texts, lemmas)]
+        return lemmas
+
+
+    def lemmatize_fil_routed(self, texts: list[str], languages: list[str]) -> list:
+        """Filipino lemmas of every text, sending only the non-English routes to calamancy"""
+        needs_calamancy = [language != self.LANGUAGE_EN for language in languages]
+        calamancy_texts = [text for text, needed in zip(texts, needs_calamancy) if needed]
+
+        if self.fil_batch_size:
+            lemmatized = self.lemmatize_fil_texts(
+                calamancy_texts,
+                batch_size=self.fil_batch_size,
+                n_process=self.fil_n_process
+            )
+        else:
+            lemmatized = [self.lemmatize_fil_tokens(text) for text in tqdm(calamancy_texts)]
 
-    def clean_raw_text(self) -> pd.DataFrame:
-        """Pipeline to clean the raw text before generating embeddings"""
+        lemmatized = iter(lemmatized)
+        return [next(lemmatized) if needed else text.split()
+                for text, needed in zip(texts, needs_calamancy)]
 
-        print(f"Setting {self.raw_text_col_name} col to str dtype...\n")
-        self.df[self.raw_text_col_name] = self.df[self.raw_text_col_name].astype(str)
 
-        print("Generating HAS_CJK column...")
-        self.df['HAS_CJK'] = self.df[self.raw_text_col_name].progress_apply(self.is_cjk)
+    def _record_routing(self, languages: list[str]) -> None:
+        """Stores and reports how many messages took each language route"""
+        self.routing_counts = dict(Counter(languages))
+        skipped = self.routing_counts.get(self.LANGUAGE_EN, 0)
+        print(f"\nLanguage routing: {self.routing_counts} "
+              f"({skipped} of {len(languages)} calamancy calls skipped)")
 
 
-        print("\nGenerating TRANSLATED_TEXT column...")
-        self.df['TRANSLATED_TEXT'] = self.df.progress_apply(self.translate_if_needed, axis=1)
+    @contextmanager
+    def _stage(self, column_name: str):
+        """Announces a clean_raw_text stage, then reports and records its throughput"""
+        print(f"\nGenerating {column_name} column...")
+        rows = len(self.df)
+        start = time.perf_counter()
+        with span(column_name, rows_in=rows) as stage_span:
+            yield
+            stage_span.rows_out = rows
 
+        elapsed = time.perf_counter() - start
+        self.stage_throughput[column_name] = rows / elapsed if elapsed > 0 else float('inf')
+        print(f"{column_name}: {rows} rows in {elapsed:.2f}s "
+              f"({self.stage_throughput[column_name]:.0f} rows/s)")
 
-        print("\nGenerating CLEANED_TEXT column...")
-        self.df['CLEANED_TEXT'] = self.df['TRANSLATED_TEXT'].progress_apply(self.text_cleaning)
 
 
-        print("\nGenerating TOKENS column...")
-        self.df['TOKENS'] = self.df['CLEANED_TEXT'].progress_apply(word_tokenize)
+    def _clean_raw_text_stepwise(self) -> None:
+        """Adds every intermediate column of the text cleaning, one stage at a time"""
+        # HAS_CJK may already come from the spam code features
+        if 'HAS_CJK' not in self.df.columns:
+            with self._stage('HAS_CJK'):
+                self.df['HAS_CJK'] = has_char_class_per_row(self.df[self.raw_text_col_name], CJK)
 
 
-        print("\nGenerating TOKENS_NO_STOPWORDS column...")
-        self.df['TOKENS_NO_STOPWORDS'] = self.df['TOKENS'].progress_apply(self.remove_stopwords)
+        with self._stage('TRANSLATED_TEXT'):
+            self.df['TRANSLATED_TEXT'] = self.translate_cjk_rows()
 
 
-        print("\nGenerating TOKENS_NO_STOPWORDS_NO_SHORT column...")
-        self.df['TOKENS_NO_STOPWORDS_NO_SHORT'] = self.df['TOKENS_NO_STOPWORDS']\
-                                                .progress_apply(self.remove_short_tokens)
+        with self._stage('CLEANED_TEXT'):
+            self.df['CLEANED_TEXT'] = self.df['TRANSLATED_TEXT'].progress_apply(self.text_cleaning)
 
 
-        print("\nGenerating TOKENS_EN_LEMMATIZED column...")
-        self.df['TOKENS_EN_LEMMATIZED'] = self.df['TOKENS_NO_STOPWORDS_NO_SHORT']\
-                                            .progress_apply(self.lemmatize_en_tokens)
+        with self._stage('TOKENS'):
+            self.df['TOKENS'] = self.df['CLEANED_TEXT'].progress_apply(self.tokenize)
 
 
-        print("\nGenerating TEXT_EN_LEMMATIZED column...")
-        self.df['TEXT_EN_LEMMATIZED'] = self.df['TOKENS_EN_LEMMATIZED']\
-                                        .progress_apply(' '.join)
+        with self._stage('TOKENS_NO_STOPWORDS'):
+            self.df['TOKENS_NO_STOPWORDS'] = self.df['TOKENS'].progress_apply(self.remove_stopwords)
 
 
-        print("\nGenerating TOKENS_FIL_LEMMATIZED column...")
-        self.df['TOKENS_FIL_LEMMATIZED'] = self.df['TEXT_EN_LEMMATIZED']\
-                                            .progress_apply(self.lemmatize_fil_tokens)
+        with self._stage('TOKENS_NO_STOPWORDS_NO_SHORT'):
+            self.df['TOKENS_NO_STOPWORDS_NO_SHORT'] = self.df['TOKENS_NO_STOPWORDS']\
+                                                    .progress_apply(self.remove_short_tokens)
 
 
-        print("\nGenerating TEXT_FINAL column...")
-        self.df['TEXT_FINAL'] = self.df['TOKENS_FIL_LEMMATIZED']\
-                                    .progress_apply(' '.join)
+        with self._stage('LANGUAGE'):
+            if self.language_routing:
+                self.df['LANGUAGE'] = self.df['TOKENS'].progress_apply(self.detect_language)
+            else:
+                self.df['LANGUAGE'] = self.LANGUAGE_MIXED
 
-        print("\nFilling NaNs of TEXT_FINAL column...")
 
-        self.df['TEXT_FINAL'] = self.df['TEXT_FINAL']\
-                                    .replace(r'^\s*$', np.nan, regex=True)\
-                                    .fillna(self.df[self.raw_text_col_name])
+        with self._stage('TOKENS_EN_LEMMATIZED'):
+            lemmatize_en = (self.df['LANGUAGE'] != self.LANGUAGE_FIL).to_numpy()
+            self.df['TOKENS_EN_LEMMATIZED'] = [
+                self.lemmatize_en_tokens(tokens) if needed else tokens
+                for tokens, needed in zip(tqdm(self.df['TOKENS_NO_STOPWORDS_NO_SHORT']), lemmatize_en)
+            ]
 
-        return self.df
 
+        with self._stage('TEXT_EN_LEMMATIZED'):
+            self.df['TEXT_EN_LEMMATIZED'] = self.df['TOKENS_EN_LEMMATIZED']\
+                                            .progress_apply(' '.join)
 
 
-if __name__ == '__main__':
-    START_DATE = '2024-05-13'
-    END_DATE = '2025-05-12'
+        with self._stage('TOKENS_FIL_LEMMATIZED'):
+            self.df['TOKENS_FIL_LEMMATIZED'] = self.lemmatize_fil_routed(
+                self.df['TEXT_EN_LEMMATIZED'].tolist(),
+                self.df['LANGUAGE'].tolist()
+            )
+        self._record_routing(self.df['LANGUAGE'].tolist())
 
-    # Convert to datetime
-    start = pd.to_datetime(START_DATE)
-    end = pd.to_datetime(END_DATE)
 
-    # Generate list with 7-day intervals
-    sample_date_list = []
-    current_date = start
-    while current_date <= end:
-        sample_date_list.append(current_date)
-        current_date += pd.Timedelta(days=7)
+        with self._stage('TEXT_FINAL'):
+            self.df['TEXT_FINAL'] = self.df['TOKENS_FIL_LEMMATIZED']\
+                                        .progress_apply(' '.join)
 
-    # Convert to string format
-    date_list_str = [date.strftime('%Y-%m-%d') for date in sample_date_list]
 
+    def _clean_raw_text_fused(self) -> None:
+        """Takes every message from raw text to TEXT_FINAL in one pass, adding only TEXT_FINAL"""
+        # HAS_CJK may already come from the spam code features
+        if 'HAS_CJK' in self.df.columns:
+            has_cjk = self.df['HAS_CJK']
+        else:
+            has_cjk = has_char_class_per_row(self.df[self.raw_text_col_name], CJK)
+
+        with self._stage('TRANSLATED_TEXT'):
+            translated_texts = self.translate_cjk_rows(has_cjk)
+
+        with self._stage('TEXT_EN_LEMMATIZED'):
+            languages = []
+            en_lemmatized_texts = []
+            for text in tqdm(translated_texts, total=len(translated_texts)):
+                tokens = self.tokenize_cleaned_text(self.text_cleaning(text))
+                language = self.detect_language(tokens) if self.language_routing \
+                           else self.LANGUAGE_MIXED
+                languages.append(language)
+                en_lemmatized_texts.append(
+                    self.filter_and_lemmatize_en(tokens, lemmatize_en=language != self.LANGUAGE_FIL)
+                )
+
+        with self._stage('TOKENS_FIL_LEMMATIZED'):
+            fil_lemmatized_tokens = self.lemmatize_fil_routed(en_lemmatized_texts, languages)
+        self._record_routing(languages)
+
+        with self._stage('TEXT_FINAL'):
+            self.df['TEXT_FINAL'] = pd.Series(
+                [' '.join(tokens) for tokens in fil_lemmatized_tokens],
+                index=self.df.index,
+                dtype=object
+            )
 
-    def read_and_concat_dfs(date_list: list = date_list_str) -> pd.DataFrame:
-        """Reading all SMS dfs and concatenating them"""
 
-        dfs = [pd.read_csv(f'sms_data/{date}.csv') for date in date_list]
 
-        len_dfs = [len(df) for df in dfs]
+    def clean_raw_text(self) -> pd.DataFrame:
+        """Pipeline to clean the raw text before generating embeddings
 
-        concat_df = pd.concat(dfs, axis=0).reset_index(drop=True)
+        Adds only TEXT_FINAL, or every intermediate column as well when debug is set.
+        """
 
-        assert sum(len_dfs) == len(concat_df)
-        return concat_df
+        print(f"Setting {self.raw_text_col_name} col to str dtype...\n")
+        self.df[self.raw_text_col_name] = self.df[self.raw_text_col_name].astype(str)
 
+        if self.debug:
+            self._clean_raw_text_stepwise()
+        else:
+            self._clean_raw_text_fused()
 
-    raw_sms_df = read_and_concat_dfs(date_list_str).rename(columns={'Content':'CONTENT'}).head(500)
+        lemma_stats = get_lemma_cache().stats()
+        print(f"\nLemma cache: {lemma_stats['hit_rate']:.1%} hit rate, "
+              f"{lemma_stats['size']} entries")
 
-    print(raw_sms_df)
+        print("\nFilling NaNs of TEXT_FINAL column...")
 
-    pipeline = TextPreprocessor(raw_sms_df)
+        self.df['TEXT_FINAL'] = self.df['TEXT_FINAL']\
+                                    .replace(r'^\s*$', np.nan, regex=True)\
+                                    .fillna(self.df[self.raw_text_col_name])
 
-    print("===== POST-PROCESSING =====")
-    print(pipeline.clean_raw_text())
+        return self.df
@@ -0,0 +1,188 @@
+"""Lightweight timing spans for the tagging pipeline.
+
+A span records wall time, CPU time, rows in and out, and memory for one step or sub-stage.
+Spans are only collected inside an active `Trace`; everywhere else `span()` costs a
+context-variable lookup. Each thread (e.g. each prediction job) has its own current trace.
+
+CPU time is that of the thread running the span, so other sessions' jobs and model warm-up
+do not count; neither does work in worker processes or helper threads. Memory is the
+resident set size sampled when the span starts and finishes. When the span raised the
+process's high-water mark, that new mark is its exact peak; otherwise the peak shown is
+the larger of the two samples, a lower bound.
+"""
+
+# standard
+import contextvars
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else None
+
+
+def process_peak_rss_mb() -> float | None:
+    """Highest resident memory of this process since it started, in MB"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def current_rss_mb() -> float | None:
+    """Resident memory of this process right now, in MB (Linux only)"""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            resident_pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * _PAGE_SIZE / (1024 * 1024)
+
+
+class Span:
+    """Measurements of one step or sub-stage"""
+
+    def __init__(self, name: str, depth: int, rows_in: int | None = None) -> None:
+        """Initialize a span that starts now"""
+        self.name = name
+        self.depth = depth
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_rss_mb = None
+        self.rss_delta_mb = None
+
+        self._start_rss = current_rss_mb()
+        self._start_peak_rss = process_peak_rss_mb()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+
+    def finish(self) -> None:
+        """Records the end of the span"""
+        self.wall_s = time.perf_counter() - self._start_wall
+        self.cpu_s = time.thread_time() - self._start_cpu
+
+        end_rss = current_rss_mb()
+        end_peak_rss = process_peak_rss_mb()
+        if end_peak_rss is not None and end_peak_rss > self._start_peak_rss:
+            self.peak_rss_mb = end_peak_rss
+        elif end_rss is not None:
+            self.peak_rss_mb = max(self._start_rss, end_rss)
+        if end_rss is not None:
+            self.rss_delta_mb = end_rss - self._start_rss
+
+    def to_dict(self) -> dict:
+        """The measurements as a JSON-friendly dict"""
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_mb': self.peak_rss_mb,
+            'rss_delta_mb': self.rss_delta_mb,
+        }
+
+
+class Trace:
+    """Spans of one run, in the order they started"""
+
+    def __init__(self, name: str = 'run') -> None:
+        """Initialize an empty trace"""
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans = []
+        self._depth = 0
+        self._token = None
+
+    def __enter__(self) -> 'Trace':
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _current_trace.reset(self._token)
+
+    def to_dicts(self) -> list[dict]:
+        """Every span as a dict"""
+        return [span_.to_dict() for span_ in self.spans]
+
+    def table(self):
+        """The spans as a frame, sub-stages indented under their step"""
+        return spans_table(self.to_dicts())
+
+    def write_json(self, path: str) -> None:
+        """Appends the trace to a JSON-lines log"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({
+                'trace': self.name,
+                'started_at': self.started_at,
+                'spans': self.to_dicts(),
+            }) + '\n')
+
+
+def spans_table(spans: list[dict]):
+    """Span dicts (e.g. ctx.summary['spans']) as a frame, sub-stages indented under their step"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    table = pd.DataFrame(spans,
+                         columns=['name', 'depth', 'wall_s', 'cpu_s', 'rows_in',
+                                  'rows_out', 'peak_rss_mb', 'rss_delta_mb'])
+    table['name'] = ['    ' * depth + name for depth, name in zip(table['depth'], table['name'])]
+    return table.drop(columns='depth')
+
+
+class _NoSpan:
+    """Stand-in yielded outside a trace; accepts and ignores row counts"""
+    rows_in = None
+    rows_out = None
+
+
+@contextmanager
+def span(name: str, rows_in: int | None = None):
+    """Records a span in the current trace, if there is one"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NoSpan()
+        return
+
+    current = Span(name, trace._depth, rows_in)  # pylint: disable=protected-access
+    trace.spans.append(current)
+    trace._depth += 1  # pylint: disable=protected-access
+    try:
+        yield current
+    finally:
+        trace._depth -= 1  # pylint: disable=protected-access
+        current.finish()
+
+
+def traced_step(rows_in: str, rows_out: str):
+    """Decorates a pipeline step taking a PipelineContext, counting rows by selection name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(ctx, *args, **kwargs):
+            def size(selection):
+                return ctx.size(selection) if ctx.has_selection(selection) else None
+
+            with span(func.__name__, rows_in=size(rows_in)) as step_span:
+                result = func(ctx, *args, **kwargs)
+                step_span.rows_out = size(rows_out)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,216 @@
+"""Seeded synthetic SMS corpus for benchmarking the tagging pipeline.
+
+Messages are drawn from templates of every kind of traffic the pipeline routes: spam codes,
+IMSI links, URL-only messages, CJK, Taglish, English, emoji-heavy promos and "no record"
+rows, mixed at CORPUS_MIX ratios. A share of rows repeats earlier messages, like the bulk
+sends in real exports. The same seed and size always give the same corpus. Write one to
+a file with:
+
+    python -m utils.synthetic_corpus corpus.csv --rows 100000 --seed 7
+"""
+
+# standard
+import argparse
+import random
+import string
+import sys
+
+# third-party
+import pandas as pd
+
+
+#### CONFIGS ####
+DEFAULT_SEED = 7
+
+# share of the distinct messages of every kind
+CORPUS_MIX = {
+    'spam_code': 0.15,
+    'imsi': 0.04,
+    'url_only': 0.06,
+    'cjk': 0.04,
+    'taglish': 0.35,
+    'english': 0.22,
+    'emoji': 0.10,
+    'no_record': 0.04,
+}
+
+# share of rows that repeat an earlier message
+DUPLICATE_SHARE = 0.3
+
+NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Joy', 'Paolo', 'Liza', 'Ramon', 'Grace']
+BRANDS = ['GCash', 'Maya', 'Shopee', 'Lazada', 'GoTyme', 'BDO', 'Jollibee', 'Globe', 'Smart']
+SHORT_DOMAINS = ['bit.ly', 'tinyurl.com', 'cutt.ly', 'is.gd', 'rb.gy', 's.id']
+DOMAINS = ['promo-ph.com', 'claim-reward.net', 'gcash-verify.info', 'loan-agad.ph', 'win-ph.xyz']
+EMOJIS = ['😀', '🎉', '💰', '🔥', '👉', '✅', '🎁', '📲', '💸', '❤️', '🇵🇭']
+
+TAGLISH_TEMPLATES = [
+    'Hi {name}! Pwede ka na mag-loan ng P{amount} sa {brand}, approved agad. Reply YES po',
+    'Congrats po {name}, nanalo ka ng P{amount} sa {brand} raffle! I-claim na bago {date}',
+    'Kuya, pasabay naman ng order sa {brand} mamaya, babayaran ko bukas',
+    'Ate {name}, nasaan ka na? Andito na ako sa mall, text mo ko pag nandito ka na',
+    'Last day na ng sale sa {brand}! Up to {percent}% off lahat ng items, shop now',
+    'Need mo ba ng extra cash? Mabilis na loan up to P{amount}, walang collateral. Call {phone}',
+    'Good morning {name}, paki-check naman yung email ko kagabi. Salamat!',
+    'Libre ang delivery today sa {brand}, gamitin ang code {code} sa checkout',
+]
+ENGLISH_TEMPLATES = [
+    'Your loan of P{amount} has been approved. Click the link to proceed.',
+    'Congratulations! You won a cash prize of P{amount}. Reply YES to claim.',
+    'Dear customer, your {brand} account will be suspended. Verify at {url}',
+    'Hey {name}, are we still on for dinner later?',
+    'Get {percent}% off on your next {brand} order. Promo ends {date}.',
+    'Your package from {brand} is out for delivery. Track it at {url}',
+    'Reminder: your bill of P{amount} is due on {date}. Pay via {brand} to avoid penalties.',
+    'Happy birthday {name}! Have a great day.',
+]
+CJK_TEMPLATES = [
+    '恭喜您获得{brand}奖金P{amount}，请点击链接领取 {url}',
+    '您好，您的贷款已批准，额度{amount}比索，请尽快联系我们',
+    '限时优惠！全场{percent}折，立即购买',
+    '您的验证码是{digits}，请勿泄露给他人',
+    '{name}你好，明天见',
+]
+SPAM_CODE_PREFIXES = ['GC', 'PM', 'WIN', 'PROMO', 'REF', 'CODE', 'OTP', 'VIP', 'PH', 'LZ']
+NO_RECORD_VARIANTS = ['no record', 'No Record', '  NO RECORD ', 'No record']
+
+# mathematical bold digits, used by senders to dodge plain digit filters
+BOLD_DIGITS = str.maketrans('0123456789', '𝟎𝟏𝟐𝟑𝟒𝟓𝟔𝟕𝟖𝟗')
+
+
+class CorpusGenerator:
+    """Draws synthetic messages of every kind from one seeded random stream"""
+
+    def __init__(self, seed: int = DEFAULT_SEED) -> None:
+        """Initialize a generator; the same seed gives the same messages"""
+        self.rng = random.Random(seed)
+
+    def _digits(self, low: int, high: int) -> str:
+        """A random string of low to high digits"""
+        return ''.join(self.rng.choices(string.digits, k=self.rng.randint(low, high)))
+
+    def _url(self) -> str:
+        """A shortened or promo URL, sometimes with a scheme"""
+        slug = ''.join(self.rng.choices(string.ascii_letters + string.digits, k=self.rng.randint(5, 8)))
+        url = f'{self.rng.choice(SHORT_DOMAINS + DOMAINS)}/{slug}'
+        return self.rng.choice(['', 'http://', 'https://']) + url
+
+    def _fill(self, template: str) -> str:
+        """A template with its placeholders filled in"""
+        return template.format(
+            name=self.rng.choice(NAMES),
+            brand=self.rng.choice(BRANDS),
+            amount=f'{self.rng.randint(1, 50) * 500:,}',
+            percent=self.rng.choice([10, 20, 30, 50, 70]),
+            date=f'{self.rng.randint(1, 12)}/{self.rng.randint(1, 28)}',
+            phone='09' + self._digits(9, 9),
+            code=self.rng.choice(SPAM_CODE_PREFIXES) + self._digits(3, 5),
+            digits=self._digits(4, 6),
+            url=self._url(),
+        )
+
+
+    ############## MESSAGE KINDS ##############
+    def spam_code(self) -> str:
+        """A lone promo or OTP-style code ending in 3-7 digits"""
+        code = self.rng.choice(SPAM_CODE_PREFIXES) + self.rng.choice(['', '-', '_', '#']) \
+               + self._digits(3, 7)
+        if self.rng.random() < 0.1:
+            code = code.translate(BOLD_DIGITS)
+        return code.lower() if self.rng.random() < 0.2 else code
+
+    def imsi(self) -> str:
+        """A tracking link carrying an IMSI, user id and timestamp"""
+        link = (f'{self.rng.choice(DOMAINS)}/r?imsi=515{self._digits(12, 12)}'
+                f'&uid={"".join(self.rng.choices(string.ascii_letters + string.digits, k=8))}'
+                f'&t={self._digits(10, 10)}')
+        if self.rng.random() < 0.5:
+            return f'{self._fill(self.rng.choice(ENGLISH_TEMPLATES[:3]))} {link}'
+        return link
+
+    def url_only(self) -> str:
+        """A message that is only a URL, sometimes broken up with spaces"""
+        url = self._url()
+        if self.rng.random() < 0.3:
+            url = url.replace('.', ' . ', 1)
+        return url
+
+    def cjk(self) -> str:
+        """A Chinese message, sometimes with a URL"""
+        return self._fill(self.rng.choice(CJK_TEMPLATES))
+
+    def taglish(self) -> str:
+        """A Filipino-English message"""
+        return self._fill(self.rng.choice(TAGLISH_TEMPLATES))
+
+    def english(self) -> str:
+        """An English message"""
+        return self._fill(self.rng.choice(ENGLISH_TEMPLATES))
+
+    def emoji(self) -> str:
+        """A Taglish or English promo with emoji around and inside it"""
+        text = self._fill(self.rng.choice(TAGLISH_TEMPLATES + ENGLISH_TEMPLATES))
+        words = text.split()
+        for _ in range(self.rng.randint(1, 4)):
+            words.insert(self.rng.randint(0, len(words)), self.rng.choice(EMOJIS))
+        return ' '.join(words)
+
+    def no_record(self) -> str:
+        """A 'no record' placeholder row"""
+        return self.rng.choice(NO_RECORD_VARIANTS)
+
+
+    def messages(self, n_rows: int, mix: dict[str, float] = CORPUS_MIX,
+                 duplicate_share: float = DUPLICATE_SHARE) -> list[tuple[str, str]]:
+        """(kind, message) pairs of n_rows rows"""
+        kinds = list(mix)
+        weights = [mix[kind] for kind in kinds]
+
+        rows = []
+        for _ in range(n_rows):
+            if rows and self.rng.random() < duplicate_share:
+                rows.append(self.rng.choice(rows))
+            else:
+                kind = self.rng.choices(kinds, weights)[0]
+                rows.append((kind, getattr(self, kind)()))
+        return rows
+
+
+def generate_corpus(n_rows: int,
+                    *,
+                    seed: int = DEFAULT_SEED,
+                    mix: dict[str, float] = CORPUS_MIX,
+                    duplicate_share: float = DUPLICATE_SHARE,
+                    text_col_name: str = 'sms_content') -> pd.DataFrame:
+    """A frame of n_rows synthetic messages, shaped like the frames the Predict page tags.
+
+    The KIND column records which kind of message every row was drawn as.
+    """
+    rows = CorpusGenerator(seed).messages(n_rows, mix, duplicate_share)
+    return pd.DataFrame({
+        'id': range(1, n_rows + 1),
+        'sender': [f'SENDER{position % 97:02d}' for position in range(n_rows)],
+        text_col_name: [message for _, message in rows],
+        'KIND': [kind for kind, _ in rows],
+    })
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Writes a synthetic corpus to a CSV or Parquet file"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='CSV or Parquet file to write')
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--text-col', default='sms_content')
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.rows, seed=args.seed, text_col_name=args.text_col)
+    if args.output.endswith('.parquet'):
+        corpus.to_parquet(args.output, index=False)
+    else:
+        corpus.to_csv(args.output, index=False)
+    print(corpus['KIND'].value_counts().to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
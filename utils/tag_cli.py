@@ -0,0 +1,76 @@
+"""Headless batch scoring: tag a CSV or Parquet export with the spam tagging pipeline.
+
+Needs neither Streamlit nor a notebook. Run from the repo root (the models are loaded
+from models/):
+
+    python -m utils.tag_cli sms_export.csv tagged.parquet --workers 8
+    python -m utils.tag_cli sms_export.parquet tagged.parquet --text-col Content --chunk-rows 100000
+    python -m utils.tag_cli sms_export.csv tagged.parquet --workers 1 --profile
+"""
+
+# standard
+import argparse
+import json
+import os
+import sys
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Command-line options"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='CSV or Parquet file of messages')
+    parser.add_argument('output', help='tagged output; Parquet unless the name ends in .csv')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for feature generation and text cleaning '
+                             '(default: every CPU)')
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help='rows scored at a time (default: STREAM_CHUNK_ROWS)')
+    parser.add_argument('--text-col', default=None,
+                        help='message column of the input (default: RAW_TEXT_COL_NAME)')
+    parser.add_argument('--progress', action='store_true',
+                        help='show tqdm progress bars and intermediate frames')
+    parser.add_argument('--profile', choices=['sampling', 'deterministic'], nargs='?',
+                        const='sampling', default=None,
+                        help='profile the run (default mode: sampling), writing a '
+                             'flame-graph-ready profile and a hot-function summary')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Tags the input file and prints a JSON summary of the run"""
+    args = parse_args(argv)
+
+    if not args.progress:
+        # tqdm reads its TQDM_* overrides when it is imported, so this goes first
+        os.environ.setdefault('TQDM_DISABLE', '1')
+
+    # pylint: disable=import-outside-toplevel
+    from utils import generate_taggings
+    from utils.profiling import profiled
+
+    generate_taggings.SHOW_FRAMES = args.progress
+
+    output_path = args.output
+    if not output_path.endswith(('.parquet', '.csv')):
+        output_path += '.parquet'
+
+    profile_mode = args.profile or generate_taggings.PROFILE_MODE
+    with profiled('tag_cli', bool(args.profile) or generate_taggings.PROFILE_RUNS,
+                  mode=profile_mode) as profile:
+        summary = generate_taggings.tag_file(
+            args.input,
+            output_path,
+            chunk_rows=args.chunk_rows or generate_taggings.STREAM_CHUNK_ROWS,
+            n_workers=args.workers,
+            text_col_name=args.text_col or generate_taggings.RAW_TEXT_COL_NAME
+        )
+
+    if profile is not None:
+        print(profile.summary)
+        summary['profile'] = profile.paths
+    print(json.dumps({'input': args.input, 'output': output_path, **summary}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""NumPy kernels for computing per-row text statistics over a whole column at once."""
+
+# standard
+from typing import Callable
+
+# third-party
+import numpy as np
+import pandas as pd
+
+
+def safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise division that returns 0.0 wherever the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(len(numerator), dtype=np.float64)
+    return np.divide(numerator, denominator, out=out, where=denominator > 0)
+
+
+class CodePointColumn:
+    """A text column flattened into a single array of Unicode code points.
+
+    Every string is laid end to end in `codepoints`, and `offsets` marks where each row
+    starts. Character predicates are evaluated once per distinct character and broadcast
+    back to every position, then reduced to one value per row.
+    """
+
+    def __init__(self, texts: pd.Series) -> None:
+        """Flatten a text column into code point arrays"""
+        values = texts.astype(str).tolist()
+
+        self.index = texts.index
+        self.texts = pd.Series(values, index=texts.index, dtype=object)
+        self.n_rows = len(values)
+        self.lengths = np.fromiter(map(len, values), dtype=np.int64, count=self.n_rows)
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths)))
+
+        joined = ''.join(values).encode('utf-32-le', 'surrogatepass')
+        self.codepoints = np.frombuffer(joined, dtype='<u4')
+        self.row_ids = np.repeat(np.arange(self.n_rows), self.lengths)
+
+        self.row_starts = np.zeros(len(self.codepoints), dtype=bool)
+        self.row_starts[self.offsets[:-1][self.lengths > 0]] = True
+
+        self._unique = None
+        self._mask_cache = {}
+
+
+    def unique_codepoints(self) -> tuple[np.ndarray, np.ndarray]:
+        """Distinct code points of the column, and each position's index into them"""
+        if self._unique is None:
+            unique, inverse = np.unique(self.codepoints, return_inverse=True)
+            self._unique = (unique, inverse.ravel())
+        return self._unique
+
+
+    def char_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Boolean mask over all positions, True where `predicate(char)` holds"""
+        if predicate not in self._mask_cache:
+            unique, inverse = self.unique_codepoints()
+            table = np.fromiter(
+                (bool(predicate(chr(codepoint))) for codepoint in unique),
+                dtype=bool,
+                count=len(unique)
+            )
+            self._mask_cache[predicate] = table[inverse]
+        return self._mask_cache[predicate]
+
+
+    def count_per_row(self, mask: np.ndarray) -> np.ndarray:
+        """Number of masked characters in each row"""
+        return np.bincount(self.row_ids[mask], minlength=self.n_rows)
+
+
+    def any_per_row(self, mask: np.ndarray) -> np.ndarray:
+        """1 if a row has at least one masked character, else 0"""
+        return (self.count_per_row(mask) > 0).astype(np.int64)
+
+
+    def max_run_per_row(self, mask: np.ndarray) -> np.ndarray:
+        """Length of the longest run of consecutive masked characters in each row"""
+        positions = np.arange(len(mask))
+
+        # a run restarts after every unmasked character and at the start of every row
+        resets = np.where(~mask, positions, np.where(self.row_starts, positions - 1, -1))
+        run_lengths = np.where(mask, positions - np.maximum.accumulate(resets), 0)
+
+        out = np.zeros(self.n_rows, dtype=np.int64)
+        non_empty = self.lengths > 0
+        if non_empty.any():
+            out[non_empty] = np.maximum.reduceat(run_lengths, self.offsets[:-1][non_empty])
+        return out
+
+
+    def token_count_per_row(self, separator_mask: np.ndarray) -> np.ndarray:
+        """Number of runs of non-separator characters in each row, like `len(str.split())`"""
+        previous_is_separator = np.roll(separator_mask, 1)
+        token_starts = ~separator_mask & (previous_is_separator | self.row_starts)
+        return self.count_per_row(token_starts)
+
+
+    def strip_mask(self, space_mask: np.ndarray) -> np.ndarray:
+        """Mask of positions that survive `str.strip()` on their row"""
+        non_space = (~space_mask).astype(np.int64)
+        inclusive = np.cumsum(non_space)
+        exclusive = inclusive - non_space
+
+        row_base = np.concatenate(([0], inclusive))[self.offsets[:-1]][self.row_ids]
+        row_total = self.count_per_row(~space_mask)[self.row_ids]
+
+        seen_from_left = inclusive - row_base > 0
+        left_from_right = row_total - (exclusive - row_base) > 0
+        return seen_from_left & left_from_right
+
+
+    def entropy_per_row(self, mask: np.ndarray) -> np.ndarray:
+        """Shannon entropy (base 2) of the masked characters in each row"""
+        unique, inverse = self.unique_codepoints()
+        n_unique = max(len(unique), 1)
+        keys = self.row_ids[mask] * n_unique + inverse[mask]
+        pair_keys, pair_counts = np.unique(keys, return_counts=True)
+
+        rows = pair_keys // n_unique
+        totals = self.count_per_row(mask)
+        probabilities = pair_counts / totals[rows]
+
+        return 0.0 - np.bincount(
+            rows, weights=probabilities * np.log2(probabilities), minlength=self.n_rows
+        )
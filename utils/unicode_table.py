@@ -0,0 +1,74 @@
+"""Precomputed Unicode character-class table shared by the spam code and spam type utilities."""
+
+# standard
+from functools import cache
+
+# third-party
+import emoji
+import numpy as np
+import pandas as pd
+
+# local
+from utils.text_kernels import CodePointColumn
+
+
+# bit flags stored per code point
+CJK = 1           # Chinese, Japanese or Korean character
+EMOJI = 2         # a single-character emoji, as `emoji.is_emoji` sees it
+EMOJI_PART = 4    # appears in at least one emoji sequence
+ODDITY = 8        # non-ASCII, and neither an emoji nor CJK
+
+CJK_RANGES = [
+    (4352, 4607), (11904, 42191), (43072, 43135),
+    (44032, 55215), (63744, 64255), (65072, 65103),
+    (65381, 65500), (131072, 196607)
+]
+
+N_CODEPOINTS = 0x110000
+
+
+@cache
+def get_char_class_table() -> bytes:
+    """Build the code point -> class flags table once per process (about 1 MB)"""
+    table = np.zeros(N_CODEPOINTS, dtype=np.uint8)
+
+    for start, end in CJK_RANGES:
+        table[start:end + 1] |= CJK
+
+    for emoji_str in emoji.EMOJI_DATA:
+        if len(emoji_str) == 1:
+            table[ord(emoji_str)] |= EMOJI
+        for char in emoji_str:
+            # ASCII parts (keycap digits, # and *) never form an emoji on their own
+            if ord(char) > 127:
+                table[ord(char)] |= EMOJI_PART
+
+    is_oddity = (table & (CJK | EMOJI)) == 0
+    is_oddity[:128] = False
+    table[is_oddity] |= ODDITY
+
+    return table.tobytes()
+
+
+def has_char_class(text: str, flag: int) -> bool:
+    """Check whether any character of the text has the given class flag.
+
+    Every class is non-ASCII, so pure ASCII texts are answered without a lookup.
+    """
+    if text.isascii():
+        return False
+
+    table = get_char_class_table()
+    return any(table[ord(char)] & flag for char in text)
+
+
+def char_class_mask(codepoints: np.ndarray, flag: int) -> np.ndarray:
+    """Boolean mask over an array of code points, True where the class flag is set"""
+    table = np.frombuffer(get_char_class_table(), dtype=np.uint8)
+    return (table[codepoints] & flag) > 0
+
+
+def has_char_class_per_row(texts: pd.Series, flag: int) -> np.ndarray:
+    """1 for every row of a text column that has a character with the class flag, else 0"""
+    column = CodePointColumn(texts)
+    return column.any_per_row(char_class_mask(column.codepoints, flag))